@@ -1,8 +1,10 @@
 import pandas as pd
 import matplotlib.pyplot as plt
+from loader import load_tracker
+from render import show
 
 # Load the CSV file
-df = pd.read_csv("Master Tracker 2024 krk(Movement).csv")
+df = load_tracker(report='Ana')
 
 # Display the first few rows of the DataFrame
 print("Data Preview:")
@@ -22,7 +24,7 @@ print("\nOutbound Movements:")
 print(outbound_movements)
 
 # Count of orders by status
-status_counts = df['SR Statues '].value_counts()
+status_counts = df['SR Statues'].value_counts()
 print("\nCount of Orders by Status:")
 print(status_counts)
 
@@ -34,4 +36,4 @@ plt.xlabel('Status')
 plt.ylabel('Count')
 plt.xticks(rotation=45)
 plt.tight_layout()
-plt.show()
\ No newline at end of file
+show('orders_by_status_bar_chart')
\ No newline at end of file
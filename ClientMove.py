@@ -1,25 +1,36 @@
 import pandas as pd
 import matplotlib.pyplot as plt
+from chunked import aggregate_tracker_chunked, streaming_chunksize
+from loader import load_tracker
+from render import show
+from topk import describe_top
 
-# Load the data
-data = pd.read_csv('Master Tracker 2024 krk(Movement).csv')
+# Number of top clients shown (e.g., top 10)
+top_n = 10
 
-# Clean up the data by dropping rows with all NaN values
-data.dropna(how='all', inplace=True)
+chunksize = streaming_chunksize()
+if chunksize:
+    # Streaming mode: a bounded Space-Saving summary of the clients replaces the full
+    # Clients x Type Of Movement table (TRACKER_TOPK sets its capacity, 0 for exact)
+    clients = aggregate_tracker_chunked(chunksize=chunksize, metrics=['client_topk'])['client_topk']
+    print(describe_top(clients, top_n))
+    filtered_movement_counts = clients.top(top_n)[['Inbound', 'Outbound']]
+else:
+    # Load the data
+    data = load_tracker(report='ClientMove')
 
-# Strip whitespace from column names
-data.columns = data.columns.str.strip()
+    # Clean up the data by dropping rows with all NaN values
+    data.dropna(how='all', inplace=True)
 
-# Group by Clients and Type Of Movement and sum counts
-movement_counts = data.groupby(['Clients', 'Type Of Movement']).size().unstack(fill_value=0)
+    # Group by Clients and Type Of Movement and sum counts
+    movement_counts = data.groupby(['Clients', 'Type Of Movement'], observed=True).size().unstack(fill_value=0)
 
-# Combine duplicate clients by summing their inbound and outbound counts
-movement_counts = movement_counts.groupby(movement_counts.index).sum()
+    # Combine duplicate clients by summing their inbound and outbound counts
+    movement_counts = movement_counts.groupby(movement_counts.index, observed=True).sum()
 
-# Get total movements and filter for top N clients (e.g., top 10)
-top_n = 10
-top_clients = movement_counts.sum(axis=1).nlargest(top_n).index
-filtered_movement_counts = movement_counts.loc[top_clients]
+    # Get total movements and filter for top N clients
+    top_clients = movement_counts.sum(axis=1).nlargest(top_n).index
+    filtered_movement_counts = movement_counts.loc[top_clients]
 
 # Separate inbound and outbound counts
 inbound_counts = filtered_movement_counts['Inbound'].sum()
@@ -34,7 +45,7 @@ plt.ylabel('Number of Movements')
 plt.xticks(rotation=45, ha='right')
 plt.legend(title='Type Of Movement')
 plt.tight_layout()
-plt.show()
+show('top_clients_movements_bar_chart')
 
 # Pie Chart for Percentage of Total Movements for Top N Clients
 plt.figure(figsize=(10, 6))
@@ -42,14 +53,14 @@ total_movements = filtered_movement_counts.sum(axis=1)
 plt.pie(total_movements, labels=total_movements.index, autopct='%1.1f%%', startangle=90)
 plt.title(f'Percentage of Total Movements for Top {top_n} Clients')
 plt.tight_layout()
-plt.show()
+show('client_movement_distribution_pie_chart')
 
 # Pie Chart for Total Inbound and Outbound
 plt.figure(figsize=(10, 6))
 plt.pie([inbound_counts, outbound_counts], labels=['Total Inbound', 'Total Outbound'], autopct='%1.1f%%', startangle=90)
 plt.title('Total Inbound vs Outbound Movements (Top Clients)')
 plt.tight_layout()
-plt.show()
+show('inbound_vs_outbound_pie_chart')
 
 # Line Graph for Inbound and Outbound Over Time (if dates were available)
 # This part will depend on your date structure; adjust accordingly
@@ -61,4 +72,4 @@ plt.title('Total Movements Over Time (Example for Top Clients)')
 plt.xlabel('Date')
 plt.ylabel('Total Movements')
 plt.tight_layout()
-plt.show()
\ No newline at end of file
+show('total_movements_over_time')
\ No newline at end of file
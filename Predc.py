@@ -1,46 +1,31 @@
 import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
-from sklearn.linear_model import LinearRegression
+from forecast import forecast_series
+from instrument import stage
+from loader import load_tracker
+from render import show
 
-# Load the data
-df = pd.read_csv("Master Tracker 2024 krk(Movement).csv")
-
-# Normalize column names by stripping whitespace
-df.columns = df.columns.str.strip()
-
-# Check for duplicate columns
-if df.columns.duplicated().any():
-    df.columns = pd.Series(df.columns).where(~df.columns.duplicated(), df.columns + '_dup')
-
-# Convert date columns to datetime
-df['Sending Date'] = pd.to_datetime(df['Sending Date'])
-df['Receiving Date'] = pd.to_datetime(df['Receiving Date'])
-
-# Convert quantities to numeric
-df['Qty\'s cases'] = pd.to_numeric(df['Qty\'s cases'], errors='coerce')
+# Load the data (column names normalized and columns typed by the loader)
+df = load_tracker(report='Predc')
 
 # Group by Sending Date and sum the quantities
 daily_orders = df.groupby('Sending Date')['Qty\'s cases'].sum().reset_index()
-
-# Fit a linear regression model on the daily orders
-daily_orders['date_num'] = (daily_orders['Sending Date'] - daily_orders['Sending Date'].min()).dt.days
-X = daily_orders[['date_num']]
 y = daily_orders['Qty\'s cases'].fillna(0)
 
-model = LinearRegression()
-model.fit(X, y)
-
-# Prepare future dates for predictions
-max_date_num = daily_orders['date_num'].max()
-future_dates = pd.DataFrame({'date_num': np.arange(max_date_num + 1, max_date_num + 121)})
-
-# Predict using the model
-predictions = model.predict(future_dates)
-
-# Output predictions
-predicted_dates = pd.date_range(start=daily_orders['Sending Date'].max() + pd.Timedelta(days=1), periods=120)
-predicted_orders = pd.DataFrame({'date': predicted_dates, 'predicted_cases': predictions})
+# Fit a linear trend on the daily orders and predict the next 120 days
+predicted_orders = forecast_series(df, 'Sending Date', value_column="Qty's cases", freq='D', horizon=120,
+                                   models=['linear'])
+predicted_orders = predicted_orders.rename(columns={'Sending Date': 'date', 'linear': 'predicted_cases'})
+predictions = predicted_orders['predicted_cases']
+
+# Forecast the next 4 months of cases for the total and for every warehouse,
+# client and movement type, with every model, in one batched fit
+series_forecasts = forecast_series(df, 'Sending Date', ['Warehouse', 'Clients', 'Type Of Movement'],
+                                   "Qty's cases", freq='M', horizon=4)
+with stage('export', rows=len(series_forecasts)):
+    series_forecasts.to_csv('cases_forecast_by_series.csv', index=False)
+print(f"Forecast {series_forecasts.groupby(['Dimension', 'Series']).ngroups} series; "
+      f"saved to cases_forecast_by_series.csv")
 
 # Plot the results
 plt.figure(figsize=(12, 6))
@@ -59,4 +44,4 @@ plt.xticks(rotation=45)
 plt.legend()
 plt.grid(True)
 plt.tight_layout()
-plt.show()
\ No newline at end of file
+show('cases_forecast')
@@ -1,23 +1,75 @@
 import pandas as pd
 import matplotlib.pyplot as plt
+from charts import plot_transit_histogram
+from chunked import aggregate_tracker_chunked, streaming_chunksize
+from instrument import stage
+from loader import load_tracker
+from reconcile import outstanding_summary, reconcile, transit_summary
+from render import show
+from sketches import sketch_quantiles
 
-df = pd.read_csv("Master Tracker 2024 krk(Movement).csv")
+chunksize = streaming_chunksize()
+if chunksize:
+    # Streaming mode: only the status and warehouse counts and the transit-time sketch are kept in memory.
+    # Pairing sent with received rows needs every row, so transit times come from the received rows' own dates.
+    aggregates = aggregate_tracker_chunked(chunksize=chunksize,
+                                           metrics=['status_counts', 'warehouse_counts', 'transit_sketch'])
+    status_counts = aggregates['status_counts']
+    warehouse_counts = aggregates['warehouse_counts']
+    transit = sketch_quantiles(aggregates['transit_sketch'])
 
-# Display the first few rows of the DataFrame
-print("Data Preview:")
-print(df.head())
+    print("\nTransit Time (days):")
+    print(transit.xs('Total', level='Dimension'))
+    print("\nTransit Time by Warehouse (days):")
+    print(transit.xs('Warehouse', level='Dimension'))
+else:
+    df = load_tracker(report='SentVsReceived')
 
-# Check for missing values
-print("\nMissing Values:")
-print(df.isnull().sum())
+    # Display the first few rows of the DataFrame
+    print("Data Preview:")
+    print(df.head())
 
-# Summary statistics of numerical columns
-print("\nSummary Statistics:")
-print(df.describe())
+    # Check for missing values
+    print("\nMissing Values:")
+    print(df.isnull().sum())
+
+    # Summary statistics of numerical columns
+    print("\nSummary Statistics:")
+    print(df.describe())
+
+    status_counts = df['SR Statues'].value_counts()
+    warehouse_counts = df['Warehouse'].value_counts()
+
+    # Pair each sent shipment with its received row and measure transit times
+    reconciled = reconcile(df)
+    shipments = reconciled['shipments']
+    outstanding = reconciled['outstanding']
+
+    print(f"\nMatched Shipments (sent and received): {int(shipments['matched'].sum())}")
+    print(f"Received Without a Sent Row: {int((~shipments['matched']).sum())}")
+    print(f"Outstanding Shipments (sent, not received): {len(outstanding)}")
+
+    print("\nTransit Time (days):")
+    print(transit_summary(shipments))
+    print("\nTransit Time by Warehouse (days):")
+    print(transit_summary(shipments, by='Warehouse'))
+
+    print(f"\nOutstanding Shipments by Warehouse (age in days as of {reconciled['as_of']:%Y-%m-%d}):")
+    print(outstanding_summary(outstanding))
+    print("\nOldest Outstanding Shipments:")
+    print(outstanding.head(20))
+
+    with stage('export', rows=len(outstanding)):
+        outstanding.to_csv('outstanding_shipments.csv', index=False)
+
+    transit_days = shipments['transit_days'].dropna()
+    if len(transit_days):
+        plot_transit_histogram(transit_days[transit_days >= 0], 'Transit Time of Received Shipments')
+        show('transit_time_histogram')
 
 # Count of sent and received orders
-sent_count = df[df['SR Statues '] == 'Sent'].shape[0]
-received_count = df[df['SR Statues '] == 'Received'].shape[0]
+sent_count = int(status_counts.get('Sent', 0))
+received_count = int(status_counts.get('Received', 0))
 
 print(f"\nTotal Sent Orders: {sent_count}")
 print(f"Total Received Orders: {received_count}")
@@ -37,15 +89,13 @@ plt.xlabel('Order Status')
 plt.ylabel('Count')
 plt.ylim(0, max(counts) + 10)  # Add some space above the bars
 plt.tight_layout()
-plt.show()
+show('sent_vs_received_bar_chart')
 
 # Count of orders by status
-status_counts = df['SR Statues '].value_counts()
 print("\nCount of Orders by Status:")
 print(status_counts)
 
 # Count of orders by Warehouse
-warehouse_counts = df['Warehouse'].value_counts()
 print("\nCount of Orders by Warehouse:")
 print(warehouse_counts)
 
@@ -57,4 +107,4 @@ plt.xlabel('Warehouse')
 plt.ylabel('Count')
 plt.xticks(rotation=45)
 plt.tight_layout()
-plt.show()
\ No newline at end of file
+show('orders_by_warehouse_bar_chart')
\ No newline at end of file
@@ -0,0 +1,176 @@
+import numpy as np
+import pandas as pd
+
+from instrument import stage
+
+# Metrics the engine knows how to compute
+METRICS = [
+    'row_count',
+    'warehouse_counts',
+    'status_counts',
+    'client_movement',
+    'monthly_outbound',
+    'monthly_inbound',
+    'outbound_qty_hist',
+]
+
+# Bins used by the quantity histograms in the reports
+HIST_BINS = 30
+
+
+# Integer codes and labels for a column; missing values get code -1
+def encode(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories
+    codes, labels = pd.factorize(series)
+    return codes, pd.Index(labels)
+
+
+# Months since 1970-01 for a datetime column; NaT becomes -1 with a False mask entry
+def month_codes(dates):
+    months = dates.to_numpy().astype('datetime64[M]')
+    valid = ~np.isnat(months)
+    codes = np.where(valid, months.astype('int64'), -1)
+    return codes, valid
+
+
+def _month_start(code):
+    return pd.Timestamp(np.datetime64(int(code), 'M'))
+
+
+# Count of each code, as a value_counts-style Series (descending, zeros dropped)
+def _value_counts(codes, labels, name):
+    counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+    result = pd.Series(counts, index=pd.Index(labels, name=name), name='count')
+    return result[result > 0].sort_values(ascending=False, kind='stable')
+
+
+def _check_metrics(metrics):
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics: {sorted(unknown)}")
+
+
+# Encode the columns the requested metrics read: (codes, labels) for the
+# categorical ones, month codes for 'Sending Date' and floats for the quantity
+def _encode_columns(df, metrics):
+    metrics = set(metrics)
+    columns = {}
+    if 'warehouse_counts' in metrics:
+        columns['Warehouse'] = encode(df['Warehouse'])
+    if 'status_counts' in metrics:
+        columns['SR Statues'] = encode(df['SR Statues'])
+    if {'client_movement', 'monthly_outbound', 'monthly_inbound', 'outbound_qty_hist'} & metrics:
+        columns['Type Of Movement'] = encode(df['Type Of Movement'])
+    if 'client_movement' in metrics:
+        columns['Clients'] = encode(df['Clients'])
+    if {'monthly_outbound', 'monthly_inbound'} & metrics:
+        columns['Sending Date'] = month_codes(df['Sending Date'])
+    if 'outbound_qty_hist' in metrics:
+        columns["Qty's cases"] = df["Qty's cases"].to_numpy(dtype='float64', na_value=np.nan)
+    return columns
+
+
+# The encoded columns restricted to the rows at `rows`; labels are shared
+def _take_rows(columns, rows):
+    taken = {}
+    for name, column in columns.items():
+        if isinstance(column, tuple):
+            taken[name] = tuple(part[rows] if isinstance(part, np.ndarray) else part for part in column)
+        else:
+            taken[name] = column[rows]
+    return taken
+
+
+# Every requested metric as bincounts over already encoded columns
+def _metrics_from_columns(columns, n_rows, metrics):
+    result = {}
+    if 'row_count' in metrics:
+        result['row_count'] = n_rows
+    if 'warehouse_counts' in metrics:
+        result['warehouse_counts'] = _value_counts(*columns['Warehouse'], 'Warehouse')
+    if 'status_counts' in metrics:
+        result['status_counts'] = _value_counts(*columns['SR Statues'], 'SR Statues')
+
+    needs_movement = {'client_movement', 'monthly_outbound', 'monthly_inbound', 'outbound_qty_hist'} & set(metrics)
+    if not needs_movement:
+        return result
+
+    movement_codes, movements = columns['Type Of Movement']
+    n_movements = len(movements)
+
+    if 'client_movement' in metrics:
+        client_codes, clients = columns['Clients']
+        valid = (client_codes >= 0) & (movement_codes >= 0)
+        keys = client_codes[valid].astype('int64') * n_movements + movement_codes[valid]
+        table = np.bincount(keys, minlength=len(clients) * n_movements).reshape(len(clients), n_movements)
+        frame = pd.DataFrame(table, index=pd.Index(clients, name='Clients'),
+                             columns=pd.Index(movements, name='Type Of Movement'))
+        result['client_movement'] = frame.loc[table.sum(axis=1) > 0, table.sum(axis=0) > 0]
+
+    if {'monthly_outbound', 'monthly_inbound'} & set(metrics):
+        months, has_month = columns['Sending Date']
+        valid = has_month & (movement_codes >= 0)
+        first = months[valid].min() if valid.any() else 0
+        n_months = (months[valid].max() - first + 1) if valid.any() else 0
+        keys = (months[valid] - first) * n_movements + movement_codes[valid]
+        table = np.bincount(keys, minlength=n_months * n_movements).reshape(n_months, n_movements)
+        for metric, movement in [('monthly_outbound', 'Outbound'), ('monthly_inbound', 'Inbound')]:
+            if metric not in metrics:
+                continue
+            column = table[:, movements.get_loc(movement)] if movement in movements else np.zeros(n_months, 'int64')
+            observed = np.flatnonzero(column)
+            result[metric] = pd.DataFrame({
+                'Sending Date': pd.DatetimeIndex([_month_start(first + i) for i in observed]),
+                'Count': column[observed].astype('int64'),
+            })
+
+    if 'outbound_qty_hist' in metrics:
+        if 'Outbound' in movements:
+            outbound = movement_codes == movements.get_loc('Outbound')
+        else:
+            outbound = np.zeros(n_rows, dtype=bool)
+        quantities = columns["Qty's cases"][outbound]
+        quantities = quantities[~np.isnan(quantities)]
+        if len(quantities):
+            result['outbound_qty_hist'] = np.histogram(quantities, bins=HIST_BINS)
+        else:
+            result['outbound_qty_hist'] = None
+
+    return result
+
+
+# Compute every requested metric from one set of encoded columns.
+# Each column is encoded once and every metric is a bincount over those codes,
+# so no filtered copies or repeated groupbys of the frame are made.
+def compute_metrics(df, metrics=METRICS):
+    _check_metrics(metrics)
+    with stage('aggregate', rows=len(df)):
+        return _metrics_from_columns(_encode_columns(df, metrics), len(df), metrics)
+
+
+# compute_metrics for every value of the `by` column, from one shared pass:
+# the columns are encoded once, the rows are grouped by one stable argsort of
+# the partition codes, and each partition's metrics are computed on its slice
+# of the codes. Returns {partition value: metrics}, largest partitions first;
+# rows with a missing partition value are left out.
+def compute_partitioned_metrics(df, by, metrics=METRICS):
+    _check_metrics(metrics)
+    with stage('aggregate', rows=len(df)):
+        return _partitioned_metrics(df, by, metrics)
+
+
+def _partitioned_metrics(df, by, metrics):
+    columns = _encode_columns(df, metrics)
+    codes, labels = encode(df[by])
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+    sizes = np.diff(bounds)
+
+    result = {}
+    for code in np.argsort(-sizes, kind='stable'):
+        if not sizes[code]:
+            continue
+        rows = order[bounds[code]:bounds[code + 1]]
+        result[labels[code]] = _metrics_from_columns(_take_rows(columns, rows), len(rows), metrics)
+    return result
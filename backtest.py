@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+
+from forecast import FORECAST_MONTHS, MOVING_AVERAGE_MONTHS, SMOOTHING_ALPHA, series_matrix
+
+# Forecasting methods replayed by the backtest:
+#   'linear'         -> least-squares trend over the observed periods (Predc.py)
+#   'moving_average' -> mean of the last 4 observed periods (all.py, warehouseschart.py)
+#   'item_average'   -> mean of the last 4 periods, gaps counted as zero (invoice.py)
+#   'exp_smoothing'  -> simple exponential smoothing (forecast.py)
+METHODS = ['linear', 'moving_average', 'item_average', 'exp_smoothing']
+
+
+# Prefix sums along time with a leading zero column: prefix[:, o] covers periods [0, o)
+def _prefix(values):
+    return np.concatenate([np.zeros((len(values), 1)), np.cumsum(values, axis=1)], axis=1)
+
+
+# Observed values of each row packed to the left, in time order, with their
+# periods and prefix sums: packed_prefix[:, c] is the sum of a row's first c observations
+def _packed(values, observed):
+    order = np.argsort(~observed, axis=1, kind='stable')
+    packed = np.take_along_axis(np.where(observed, values, 0.0), order, axis=1)
+    return packed, order, _prefix(packed)
+
+
+# Exponential smoothing level after each row's first c observations (NaN for c = 0).
+# One vectorized recursion over observation number for all series at once.
+def _smoothing_levels(packed, counts, alpha):
+    levels = np.full((packed.shape[0], packed.shape[1] + 1), np.nan)
+    if packed.shape[1]:
+        levels[:, 1] = packed[:, 0]
+    for c in range(1, packed.shape[1]):
+        levels[:, c + 1] = np.where(c < counts, alpha * packed[:, c] + (1 - alpha) * levels[:, c], levels[:, c])
+    return levels
+
+
+# Forecasts of every method made at each origin, for `step` periods ahead.
+# An origin o forecasts from periods [0, o) only. Returns {method: (series, origins)}.
+def _origin_forecasts(state, origins, step, methods, window):
+    rows = np.arange(state['n_series'])[:, None]
+    seen = state['seen'][:, origins]
+    forecasts = {}
+
+    if 'linear' in methods:
+        p = {name: prefix[:, origins] for name, prefix in state['linear'].items()}
+        denominator = p['n'] * p['tt'] - p['t'] ** 2
+        slope = np.divide(p['n'] * p['ty'] - p['t'] * p['y'], denominator,
+                          out=np.zeros_like(denominator), where=denominator > 0)
+        intercept = np.divide(p['y'] - slope * p['t'], p['n'], out=np.full_like(denominator, np.nan),
+                              where=p['n'] > 0)
+        forecasts['linear'] = intercept + slope * (origins - 1 + step)
+
+    if 'moving_average' in methods:
+        width = np.minimum(seen, window)
+        total = state['packed_prefix'][rows, seen] - state['packed_prefix'][rows, seen - width]
+        forecasts['moving_average'] = np.divide(total, width, out=np.full(seen.shape, np.nan), where=width > 0)
+
+    if 'item_average' in methods:
+        # Window ends at the last period observed before the origin
+        last = state['positions'][rows, np.maximum(seen - 1, 0)]
+        width = np.where(seen > 0, np.minimum(last - state['first'][:, None] + 1, window), 0)
+        total = state['value_prefix'][rows, last + 1] - state['value_prefix'][rows, last + 1 - width]
+        forecasts['item_average'] = np.divide(total, width, out=np.full(seen.shape, np.nan), where=width > 0)
+
+    if 'exp_smoothing' in methods:
+        forecasts['exp_smoothing'] = state['levels'][rows, seen]
+
+    return forecasts
+
+
+# Replay history with a rolling forecast origin and score every method per series.
+# At each origin the methods see only the periods before it and forecast the
+# next `horizon` periods; every observed target period is scored. All methods
+# come from prefix sums over the matrix, so no model is refitted per origin.
+# Returns one row per (series, method) with MAE, MAPE (%, zero actuals
+# skipped), bias (mean forecast - actual) and the number of scored points.
+def backtest_matrix(values, observed, horizon=FORECAST_MONTHS, origins=None, methods=METHODS,
+                    window=MOVING_AVERAGE_MONTHS, alpha=SMOOTHING_ALPHA):
+    unknown = set(methods) - set(METHODS)
+    if unknown:
+        raise ValueError(f"Unknown methods: {sorted(unknown)}")
+    values = np.asarray(values, dtype='float64')
+    observed = np.asarray(observed, dtype=bool)
+    n_series, n_periods = values.shape
+    if origins is None:
+        origins = np.arange(1, n_periods)
+    origins = np.asarray(origins)
+
+    t = np.arange(n_periods, dtype='float64')
+    y = np.where(observed, values, 0.0)
+    w = observed.astype('float64')
+    packed, positions, packed_prefix = _packed(values, observed)
+    counts = observed.sum(axis=1)
+    state = {
+        'n_series': n_series,
+        'seen': _prefix(w).astype('int64'),
+        'linear': {'n': _prefix(w), 't': _prefix(w * t), 'tt': _prefix(w * t * t),
+                   'y': _prefix(y), 'ty': _prefix(y * t)},
+        'packed_prefix': packed_prefix,
+        'positions': positions,
+        'value_prefix': _prefix(values),
+        'first': observed.argmax(axis=1),
+        'levels': _smoothing_levels(packed, counts, alpha) if 'exp_smoothing' in methods else None,
+    }
+
+    totals = {method: {name: np.zeros(n_series) for name in ['abs', 'pct', 'pct_n', 'err', 'n']}
+              for method in methods}
+    for step in range(1, horizon + 1):
+        valid_origins = origins[origins - 1 + step < n_periods]
+        if not len(valid_origins):
+            continue
+        targets = valid_origins - 1 + step
+        actual = values[:, targets]
+        scored = observed[:, targets]
+        for method, forecast in _origin_forecasts(state, valid_origins, step, methods, window).items():
+            mask = scored & ~np.isnan(forecast)
+            error = np.where(mask, forecast - actual, 0.0)
+            nonzero = mask & (actual != 0)
+            pct = np.divide(np.abs(error), np.abs(actual), out=np.zeros_like(error), where=nonzero)
+            total = totals[method]
+            total['abs'] += np.abs(error).sum(axis=1)
+            total['err'] += error.sum(axis=1)
+            total['n'] += mask.sum(axis=1)
+            total['pct'] += pct.sum(axis=1)
+            total['pct_n'] += nonzero.sum(axis=1)
+
+    scores = []
+    for method in methods:
+        total = totals[method]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scores.append(pd.DataFrame({
+                'series': np.arange(n_series),
+                'method': method,
+                'MAE': total['abs'] / total['n'],
+                'MAPE': 100 * total['pct'] / total['pct_n'],
+                'bias': total['err'] / total['n'],
+                'points': total['n'].astype('int64'),
+            }))
+    return pd.concat(scores, ignore_index=True)
+
+
+# backtest_matrix over the total and every warehouse/client/... series of a frame.
+# Returns the scores with Dimension and Series columns instead of row numbers.
+def backtest_series(df, date_column, by=(), value_column=None, freq='M', horizon=FORECAST_MONTHS,
+                    origins=None, methods=METHODS, window=MOVING_AVERAGE_MONTHS, alpha=SMOOTHING_ALPHA):
+    sums, present = series_matrix(df, date_column, by, value_column, freq)
+    scores = backtest_matrix(sums.to_numpy(), present.to_numpy(), horizon, origins, methods, window, alpha)
+    labels = sums.index.to_frame(index=False).iloc[scores.pop('series')].reset_index(drop=True)
+    return pd.concat([labels, scores], axis=1)
+
+
+# Mean of each score per method over the series, best MAE first
+def summarize(scores):
+    summary = scores.groupby('method')[['MAE', 'MAPE', 'bias']].mean()
+    summary['series'] = scores.groupby('method')['points'].apply(lambda points: int((points > 0).sum()))
+    return summary.sort_values('MAE')
+
+
+if __name__ == '__main__':
+    import sys
+
+    from loader import TRACKER_CSV, load_tracker
+
+    path = sys.argv[1] if len(sys.argv) > 1 else TRACKER_CSV
+    freq = sys.argv[2] if len(sys.argv) > 2 else 'M'
+    df = load_tracker(path, columns=['Sending Date', 'Warehouse', 'Clients', 'Type Of Movement', "Qty's cases"])
+    scores = backtest_series(df, 'Sending Date', ['Warehouse', 'Clients', 'Type Of Movement'],
+                             "Qty's cases", freq=freq)
+    print(summarize(scores))
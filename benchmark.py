@@ -0,0 +1,183 @@
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+from instrument import TRACE_ENV
+from loader import INVOICE_CSV
+from render import OUTPUT_DIR_ENV
+from synthetic import write_invoices, write_tracker
+
+# Every report script, with the input it reads
+REPORTS = {
+    'all': 'tracker',
+    'Pre': 'tracker',
+    'Predc': 'tracker',
+    'ClientMove': 'tracker',
+    'SentVsReceived': 'tracker',
+    'warehouseschart': 'tracker',
+    'Ana': 'tracker',
+    'invoice': 'invoices',
+    'invoicepre': 'invoices',
+}
+
+# Benchmark stage of each traced stage (see instrument.STAGES); time outside any
+# traced stage (imports, printing, untraced plotting calls) counts as 'other'
+STAGE_OF = {
+    'load': 'load',
+    'normalize': 'clean',
+    'parse_dates': 'clean',
+    'filter': 'clean',
+    'aggregate': 'aggregate',
+    'forecast': 'forecast',
+    'render': 'render',
+    'export': 'export',
+}
+
+# Stages reported for every report, in order; stages a report never enters are left out
+STAGES = ['load', 'clean', 'aggregate', 'forecast', 'render', 'export', 'other', 'total']
+
+# Sizes benchmarked when none are given
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+
+# Where generated inputs are kept between runs
+DATA_DIR_ENV = 'BENCH_DATA_DIR'
+DEFAULT_DATA_DIR = os.path.join('.cache', 'bench')
+
+# Set by the loader's TRACKER_FILES switch to point a report at another tracker
+TRACKER_FILES_ENV = 'TRACKER_FILES'
+
+
+# Generated input of `kind` with `rows` rows, written once and reused
+def dataset(kind, rows, seed=0, data_dir=None):
+    data_dir = data_dir or os.environ.get(DATA_DIR_ENV) or DEFAULT_DATA_DIR
+    path = os.path.join(data_dir, f'{kind}_{rows}_{seed}.csv')
+    if not os.path.exists(path):
+        writer = write_tracker if kind == 'tracker' else write_invoices
+        writer(path + '.tmp', rows, seed)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+# Hard link `source` as `target`, or copy it where links aren't possible
+def _link(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+# Run one report script on `path` with tracing on, headless, in a fresh scratch
+# folder (so no load cache or chart cache of an earlier run is reused), and
+# return its seconds per stage
+def _run_once(report, path):
+    with tempfile.TemporaryDirectory(prefix=f'bench_{report}_') as work:
+        env = dict(os.environ, MPLBACKEND='Agg')
+        env[TRACE_ENV] = os.path.join(work, 'trace.json')
+        env[OUTPUT_DIR_ENV] = os.path.join(work, 'charts')
+        if REPORTS[report] == 'tracker':
+            env[TRACKER_FILES_ENV] = os.path.abspath(path)
+        else:
+            _link(path, os.path.join(work, INVOICE_CSV))
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), f'{report}.py')
+        done = subprocess.run([sys.executable, script], cwd=work, env=env, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.PIPE, text=True)
+        if done.returncode != 0:
+            raise RuntimeError(f"{report}.py failed on {path}:\n{done.stderr[-2000:]}")
+        with open(env[TRACE_ENV]) as f:
+            trace = json.load(f)
+
+    seconds = dict.fromkeys(STAGES, 0.0)
+    for row in trace['summary']:
+        seconds[STAGE_OF.get(row['stage'], 'other')] += row['self']
+    seconds['other'] += trace['total_wall'] - sum(row['self'] for row in trace['summary'])
+    seconds['total'] = trace['total_wall']
+    return seconds
+
+
+# Time every stage of one report on one input; each stage's best of `repeat` runs
+def run_report(report, path, repeat=1):
+    best = {}
+    for _ in range(repeat):
+        for stage, elapsed in _run_once(report, path).items():
+            best[stage] = min(best.get(stage, elapsed), elapsed)
+    return {stage: seconds for stage, seconds in best.items() if seconds > 0}
+
+
+def _git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+# Run the reports at every size and return the results as one JSON-ready dict
+def run_benchmarks(rows=DEFAULT_ROWS, reports=None, repeat=1, seed=0, data_dir=None):
+    results = []
+    for n in rows:
+        for report in reports or list(REPORTS):
+            path = dataset(REPORTS[report], n, seed, data_dir)
+            for stage, seconds in run_report(report, path, repeat).items():
+                results.append({'report': report, 'rows': n, 'stage': stage, 'seconds': round(seconds, 6)})
+                print(f"{report:>15} {n:>10,} {stage:>9} {seconds:8.3f}s")
+    return {
+        'version': _git_version(),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'seed': seed,
+        'repeat': repeat,
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'matplotlib': matplotlib.__version__,
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+
+# Seconds per (report, rows, stage) of two result files side by side, with the ratio new / old
+def compare(old, new):
+    def frame(results):
+        return pd.DataFrame(results['results']).set_index(['report', 'rows', 'stage'])['seconds']
+
+    table = pd.concat({'old': frame(old), 'new': frame(new)}, axis=1)
+    table['ratio'] = table['new'] / table['old']
+    return table
+
+
+if __name__ == '__main__':
+    import sys
+
+    # benchmark.py [rows ...] [--reports all,Pre,...] [--out results.json] [--repeat N] [--compare old.json]
+    args = sys.argv[1:]
+    options = {}
+    for flag in ['--reports', '--out', '--repeat', '--compare']:
+        if flag in args:
+            i = args.index(flag)
+            options[flag] = args[i + 1]
+            del args[i:i + 2]
+    sizes = [int(float(arg)) for arg in args] or DEFAULT_ROWS
+
+    reports = options['--reports'].split(',') if '--reports' in options else None
+    unknown = set(reports or []) - set(REPORTS)
+    if unknown:
+        raise SystemExit(f"Unknown reports {sorted(unknown)}; use {list(REPORTS)}")
+    output = run_benchmarks(sizes, reports=reports, repeat=int(options.get('--repeat', 1)))
+    out = options.get('--out', f"benchmark_{output['version'] or 'local'}.json")
+    with open(out, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"Results written to {out}")
+
+    if '--compare' in options:
+        with open(options['--compare']) as f:
+            print(compare(json.load(f), output).to_string())
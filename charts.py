@@ -0,0 +1,176 @@
+import pandas as pd
+import matplotlib.pyplot as plt
+
+
+# Forecast chart for one item: history, predicted months and a connecting line.
+# Draws on a new figure and leaves showing/saving to the caller, so it can
+# also run inside render.render_parallel workers.
+def plot_item_forecast(item, pred_data):
+    plt.figure(figsize=(12, 6))
+
+    # Historical data
+    plt.plot(pred_data['Invoice Date'], pred_data['Quantity'], marker='o', label='Historical Data', color='orange',
+             linestyle='-')
+
+    # Predicted data
+    plt.plot(pred_data['Invoice Date'], pred_data['Predicted Quantity'], linestyle='--', marker='o',
+             label='Predicted Quantity', color='blue')
+
+    # Prepare combined data for connecting lines
+    future_dates = pred_data.loc[pred_data['Predicted Quantity'].notna(), 'Invoice Date']
+    future_length = len(future_dates)
+
+    combined_dates = pd.concat([pred_data['Invoice Date'], pd.Series(future_dates)])
+    combined_data = pd.concat(
+        [pred_data['Quantity'], pd.Series([pred_data['Predicted Quantity'].iloc[0]] * future_length)])
+
+    # Connect the lines
+    plt.plot(combined_dates, combined_data, linestyle='-', color='blue', alpha=0.5)
+
+    plt.title(f'Forecast for {item}')
+    plt.xlabel('Date')
+    plt.ylabel('Quantity Sold')
+    plt.xticks(rotation=45)
+    plt.legend()
+    plt.tight_layout()
+
+
+# Outbound and inbound monthly counts with their moving-average forecasts (all.py)
+def plot_movements_forecast(outbound_counts, inbound_counts, future_predictions_outbound, future_predictions_inbound):
+    # Concatenate historical and future data for outbound and inbound plotting
+    combined_data_outbound = pd.concat([outbound_counts.rename(columns={'Count': 'Value'}),
+                                        future_predictions_outbound.rename(columns={'Predicted Count': 'Value'})])
+
+    combined_data_inbound = pd.concat([inbound_counts.rename(columns={'Count': 'Value'}),
+                                       future_predictions_inbound.rename(columns={'Predicted Count': 'Value'})])
+
+    # Plotting both historical and predicted data for Outbound and Inbound
+    plt.figure(figsize=(12, 6))
+    plt.plot(combined_data_outbound['Sending Date'], combined_data_outbound['Value'], marker='o', color='blue',
+             label='Outbound Data')
+    plt.plot(combined_data_inbound['Sending Date'], combined_data_inbound['Value'], marker='o', color='green',
+             label='Inbound Data')
+
+    # Forecast lines
+    forecast_start_outbound = future_predictions_outbound['Sending Date'].iloc[0]
+    forecast_start_inbound = future_predictions_inbound['Sending Date'].iloc[0]
+
+    plt.axvline(x=forecast_start_outbound, color='blue', linestyle='--', label='Outbound Forecast Start')
+    plt.axvline(x=forecast_start_inbound, color='green', linestyle='--', label='Inbound Forecast Start')
+
+    plt.plot(future_predictions_outbound['Sending Date'], future_predictions_outbound['Predicted Count'],
+             linestyle='--', color='blue', alpha=0.5, label='Outbound Predicted Count')
+    plt.plot(future_predictions_inbound['Sending Date'], future_predictions_inbound['Predicted Count'], linestyle='--',
+             color='green', alpha=0.5, label='Inbound Predicted Count')
+
+    plt.title('Outbound and Inbound Movements Forecast for Next 4 Months (Starting from September 2024)')
+    plt.xlabel('Date')
+    plt.ylabel('Count of Movements')
+    plt.xticks(rotation=45)
+    plt.xlim(pd.Timestamp('2024-01-01'), future_predictions_outbound['Sending Date'].max())
+    plt.tight_layout()
+    plt.legend()
+
+
+# Histogram from precomputed (counts, edges) bins
+def plot_quantity_histogram(hist, title, color='lightcoral'):
+    counts, edges = hist
+    plt.figure(figsize=(10, 6))
+    plt.hist(edges[:-1], bins=edges, weights=counts, color=color, edgecolor='black')
+    plt.title(title)
+    plt.xlabel('Quantity of Cases')
+    plt.ylabel('Frequency')
+    plt.tight_layout()
+
+
+# Stacked inbound/outbound bars for the top clients
+def plot_client_movements_bar(filtered_movement_counts, title):
+    plt.figure(figsize=(15, 8))
+    filtered_movement_counts.plot(kind='bar', stacked=True, ax=plt.gca())
+    plt.title(title)
+    plt.xlabel('Clients')
+    plt.ylabel('Number of Movements')
+    plt.xticks(rotation=45, ha='right')
+    plt.legend(title='Type Of Movement')
+    plt.tight_layout()
+
+
+# Share of total movements per top client
+def plot_client_share_pie(total_movements, title):
+    plt.figure(figsize=(10, 6))
+    plt.pie(total_movements, labels=total_movements.index, autopct='%1.1f%%', startangle=90)
+    plt.title(title)
+    plt.tight_layout()
+
+
+# Total inbound vs total outbound
+def plot_inbound_outbound_pie(inbound_total, outbound_total, title):
+    plt.figure(figsize=(10, 6))
+    plt.pie([inbound_total, outbound_total], labels=['Total Inbound', 'Total Outbound'], autopct='%1.1f%%',
+            startangle=90)
+    plt.title(title)
+    plt.tight_layout()
+
+
+# Example line of top-client totals against placeholder daily dates
+def plot_total_movements_example(movement_totals):
+    plt.figure(figsize=(10, 6))
+    dates = pd.date_range(start='2024-01-01', periods=len(movement_totals), freq='D')
+    plt.plot(dates, movement_totals, marker='o')
+    plt.title('Total Movements Over Time (Example for Top Clients)')
+    plt.xlabel('Date')
+    plt.ylabel('Total Movements')
+    plt.tight_layout()
+
+
+# Order counts of the top warehouses
+def plot_top_warehouses_bar(top_n_warehouses, title):
+    plt.figure(figsize=(10, 6))
+    top_n_warehouses.plot(kind='bar', color='lightgreen')
+    plt.title(title)
+    plt.xlabel('Warehouse')
+    plt.ylabel('Count')
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+
+
+# Share of orders across the top warehouses
+def plot_warehouse_pie(top_n_warehouses, title):
+    plt.figure(figsize=(8, 8))
+    top_n_warehouses.plot(kind='pie', autopct='%1.1f%%', startangle=90, colors=plt.cm.Paired.colors)
+    plt.title(title)
+    plt.ylabel('')
+    plt.tight_layout()
+
+
+# Order counts by SR status
+def plot_status_bar(status_counts, title):
+    plt.figure(figsize=(10, 6))
+    status_counts.plot(kind='bar', color='skyblue')
+    plt.title(title)
+    plt.xlabel('Status')
+    plt.ylabel('Count')
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+
+
+# Monthly outbound counts as a line
+def plot_outbound_over_time(outbound_counts, title):
+    plt.figure(figsize=(12, 6))
+    plt.plot(outbound_counts['Sending Date'], outbound_counts['Count'], marker='o', color='orange')
+    plt.title(title)
+    plt.xlabel('Date')
+    plt.ylabel('Count of Outbound Cases')
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+
+
+# Distribution of transit days (receiving - sending) of the reconciled shipments
+def plot_transit_histogram(transit_days, title):
+    plt.figure(figsize=(10, 6))
+    plt.hist(transit_days, bins=30, color='skyblue', edgecolor='black')
+    plt.title(title)
+    plt.xlabel('Transit Days')
+    plt.ylabel('Shipments')
+    plt.grid(True)
+    plt.tight_layout()
@@ -0,0 +1,224 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from aggregates import HIST_BINS
+from instrument import traced
+from loader import TRACKER_CSV, expand_paths, finish_frame, raw_usecols
+from schema import TRACKER_SCHEMA, read_dtypes
+from sketches import bucket_values, quantity_sketch, transit_sketch
+from topk import MOVEMENTS, SpaceSaving, topk_capacity
+
+# Rows per chunk when streaming the tracker
+DEFAULT_CHUNKSIZE = 500_000
+
+# Set TRACKER_CHUNKSIZE to make the reports stream the tracker instead of loading it whole
+CHUNKSIZE_ENV = 'TRACKER_CHUNKSIZE'
+
+# Aggregates the streaming mode can produce
+STREAMING_METRICS = ['warehouse_counts', 'status_counts', 'client_movement', 'monthly_movement',
+                     'outbound_quantities']
+
+# Distribution sketches (sketches.py) the streaming mode can keep on request
+SKETCH_METRICS = ['quantity_sketch', 'transit_sketch']
+
+# Bounded top-N summaries (topk.py) that can replace 'client_movement' and 'warehouse_counts'
+TOPK_METRICS = ['client_topk', 'warehouse_topk']
+
+# Tracker columns each aggregate needs
+METRIC_COLUMNS = {
+    'warehouse_counts': ['Warehouse'],
+    'status_counts': ['SR Statues'],
+    'client_movement': ['Clients', 'Type Of Movement'],
+    'monthly_movement': ['Sending Date', 'Type Of Movement'],
+    'outbound_quantities': ['Type Of Movement', "Qty's cases"],
+    'quantity_sketch': ['Sending Date', 'Warehouse', 'Clients', 'Type Of Movement', "Qty's cases"],
+    'transit_sketch': ['Sending Date', 'Receiving Date', 'Warehouse', 'Clients', 'SR Statues'],
+    'client_topk': ['Clients', 'Type Of Movement'],
+    'warehouse_topk': ['Warehouse'],
+}
+
+
+# Tracker columns needed to compute `metrics`, plus 'Sending Date' when filtering by date
+def metric_columns(metrics, date_until=None):
+    columns = {c for m in metrics for c in METRIC_COLUMNS[m]}
+    if date_until is not None:
+        columns.add('Sending Date')
+    return sorted(columns)
+
+
+# Chunk size requested through the environment, or None for the in-memory path
+def streaming_chunksize():
+    value = os.environ.get(CHUNKSIZE_ENV)
+    return int(value) if value else None
+
+
+# File-like view over bytes [start, end) of an open file, so read_csv stops at `end`
+class _ByteRange:
+    def __init__(self, f, start, end):
+        f.seek(start)
+        self._f = f
+        self._left = end - start
+
+    def read(self, size=-1):
+        if self._left <= 0:
+            return b''
+        size = self._left if size is None or size < 0 else min(size, self._left)
+        data = self._f.read(size)
+        self._left -= len(data)
+        return data
+
+
+# Yield the tracker in typed chunks of at most `chunksize` rows.
+# `start`/`end` restrict parsing to a byte range of data rows (e.g. rows appended
+# since the last run); the header is still taken from the top of the file.
+# `date_formats` maps date columns to their detected format (see schema.apply_schema).
+def iter_tracker_chunks(path=TRACKER_CSV, chunksize=DEFAULT_CHUNKSIZE, columns=None, start=0, end=None,
+                        date_formats=None):
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = raw_usecols(header, TRACKER_SCHEMA, columns)
+    dtype = read_dtypes(header, TRACKER_SCHEMA)
+    # Date formats are detected on the first chunk and reused for the rest. Pass the
+    # formats of an earlier read (filled in place) so a resumed read parses the same way.
+    if date_formats is None:
+        date_formats = {}
+
+    if start == 0 and end is None:
+        for chunk in pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=chunksize):
+            yield finish_frame(chunk, TRACKER_SCHEMA, date_formats)
+        return
+
+    if end is None:
+        end = os.path.getsize(path)
+    if start >= end:
+        return
+    names = {'header': None, 'names': list(header)} if start > 0 else {}
+    with open(path, 'rb') as f:
+        reader = pd.read_csv(_ByteRange(f, start, end), usecols=usecols, dtype=dtype, chunksize=chunksize, **names)
+        for chunk in reader:
+            yield finish_frame(chunk, TRACKER_SCHEMA, date_formats)
+
+
+# Partial aggregates for one chunk, as flat count Series that can be added together
+def partial_aggregates(chunk, metrics=STREAMING_METRICS):
+    partial = {}
+    if 'warehouse_counts' in metrics:
+        partial['warehouse_counts'] = chunk['Warehouse'].value_counts()
+    if 'status_counts' in metrics:
+        partial['status_counts'] = chunk['SR Statues'].value_counts()
+    if 'client_movement' in metrics:
+        partial['client_movement'] = chunk.groupby(['Clients', 'Type Of Movement'], observed=True).size()
+    if 'monthly_movement' in metrics:
+        month = chunk['Sending Date'].dt.to_period('M').rename('Sending Date')
+        partial['monthly_movement'] = chunk.groupby([month, chunk['Type Of Movement']], observed=True).size()
+    if 'outbound_quantities' in metrics:
+        # Counts per quantity bucket (exact for whole numbers), so the histogram can be rebuilt after merging
+        quantities = chunk.loc[chunk['Type Of Movement'] == 'Outbound', "Qty's cases"].dropna()
+        partial['outbound_quantities'] = pd.Series(bucket_values(quantities.to_numpy())).value_counts()
+    if 'quantity_sketch' in metrics:
+        partial['quantity_sketch'] = quantity_sketch(chunk)
+    if 'transit_sketch' in metrics:
+        partial['transit_sketch'] = transit_sketch(chunk)
+    if 'client_topk' in metrics:
+        partial['client_topk'] = SpaceSaving(topk_capacity(), MOVEMENTS).update(
+            chunk['Clients'], chunk['Type Of Movement'])
+    if 'warehouse_topk' in metrics:
+        partial['warehouse_topk'] = SpaceSaving(topk_capacity()).update(chunk['Warehouse'])
+    return partial
+
+
+def _plain_level(level):
+    return level.astype(object) if isinstance(level.dtype, pd.CategoricalDtype) else level
+
+
+# Drop the categorical dtype from an index so partials from different chunks align
+def _plain_index(counts):
+    if isinstance(counts.index, pd.MultiIndex):
+        counts.index = pd.MultiIndex.from_arrays(
+            [_plain_level(counts.index.get_level_values(i)) for i in range(counts.index.nlevels)],
+            names=counts.index.names)
+    else:
+        counts.index = _plain_level(counts.index)
+    return counts
+
+
+# Add the partial aggregates of one chunk into the running totals
+def merge_aggregates(totals, partial):
+    for name, counts in partial.items():
+        if isinstance(counts, SpaceSaving):
+            totals[name] = totals[name].merge(counts) if name in totals else counts
+            continue
+        counts = _plain_index(counts[counts > 0])
+        if name in totals:
+            totals[name] = totals[name].add(counts, fill_value=0)
+        else:
+            totals[name] = counts
+    return totals
+
+
+# Monthly counts of one movement type, shaped like the reports' outbound_counts/inbound_counts
+def _monthly_counts(monthly, movement):
+    if movement in monthly.index.get_level_values('Type Of Movement'):
+        counts = monthly.xs(movement, level='Type Of Movement')
+    else:
+        counts = pd.Series(dtype='int64')
+    counts = counts.sort_index().astype('int64').reset_index(name='Count')
+    counts.columns = ['Sending Date', 'Count']
+    counts['Sending Date'] = pd.PeriodIndex(counts['Sending Date'], freq='M').to_timestamp()
+    return counts
+
+
+# Turn running totals into the same outputs the in-memory reports build
+def finalize_aggregates(totals):
+    result = {}
+    if 'warehouse_counts' in totals:
+        result['warehouse_counts'] = totals['warehouse_counts'].astype('int64').sort_values(ascending=False)
+    if 'status_counts' in totals:
+        result['status_counts'] = totals['status_counts'].astype('int64').sort_values(ascending=False)
+    if 'client_movement' in totals:
+        result['client_movement'] = totals['client_movement'].astype('int64').unstack(fill_value=0)
+    if 'monthly_movement' in totals:
+        monthly = totals['monthly_movement']
+        result['monthly_outbound'] = _monthly_counts(monthly, 'Outbound')
+        result['monthly_inbound'] = _monthly_counts(monthly, 'Inbound')
+    if 'outbound_quantities' in totals:
+        quantities = totals['outbound_quantities']
+        result['outbound_qty_hist'] = None
+        if len(quantities):
+            counts, edges = np.histogram(quantities.index.to_numpy(dtype='float64'), bins=HIST_BINS,
+                                         weights=quantities.to_numpy())
+            result['outbound_qty_hist'] = (counts.astype('int64'), edges)
+    for name in SKETCH_METRICS:
+        if name in totals:
+            result[name] = totals[name].astype('int64').sort_index()
+    for name in TOPK_METRICS:
+        if name in totals:
+            result[name] = totals[name]
+    return result
+
+
+# Stream the tracker (or every tracker matched by a glob) in bounded chunks and
+# return the merged aggregates. Only one chunk plus the per-group totals are
+# held in memory at a time.
+@traced('aggregate')
+def aggregate_tracker_chunked(path=TRACKER_CSV, chunksize=DEFAULT_CHUNKSIZE, metrics=STREAMING_METRICS,
+                              date_until=None):
+    columns = metric_columns(metrics, date_until)
+    totals = {}
+    for file_path in expand_paths(path):
+        for chunk in iter_tracker_chunks(file_path, chunksize=chunksize, columns=columns):
+            if date_until is not None:
+                chunk = chunk[chunk['Sending Date'] <= date_until]
+            merge_aggregates(totals, partial_aggregates(chunk, metrics))
+    return finalize_aggregates(totals)
+
+
+if __name__ == '__main__':
+    import sys
+
+    path = sys.argv[1] if len(sys.argv) > 1 else TRACKER_CSV
+    chunksize = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_CHUNKSIZE
+    for name, value in aggregate_tracker_chunked(path, chunksize=chunksize).items():
+        print(f"\n{name}:")
+        print(value)
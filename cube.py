@@ -0,0 +1,357 @@
+import itertools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from aggregates import HIST_BINS, encode, month_codes
+from chunked import DEFAULT_CHUNKSIZE, iter_tracker_chunks
+from instrument import traced
+from loader import CACHE_DIR, TRACKER_CSV, cache_name, expand_paths, file_hash
+from sketches import bucket_values
+
+# Set TRACKER_CUBE=1 to make all.py and Pre.py answer their charts from the cube
+CUBE_ENV = 'TRACKER_CUBE'
+
+# Dimensions every chart slices or rolls up; 'Month' is the Sending Date month
+DIMENSIONS = ['Month', 'Warehouse', 'Clients', 'Type Of Movement', 'SR Statues']
+
+# Measures per cell: number of rows and sum of Qty's cases
+MEASURES = ['rows', 'cases']
+
+# Tracker columns the cube is built from
+CUBE_COLUMNS = ['Sending Date', 'Warehouse', 'Clients', 'Type Of Movement', 'SR Statues', "Qty's cases"]
+
+# Rollups with at most this many cells are materialized as dense arrays
+DENSE_LIMIT = 1_000_000
+
+# Bumped whenever the layout of the saved cube changes
+CUBE_VERSION = 1
+
+
+def cube_enabled():
+    return os.environ.get(CUBE_ENV, '') not in ('', '0')
+
+
+# Integer codes and labels of one dimension; missing values get code -1
+def _encode_dimension(df, dimension):
+    if dimension != 'Month':
+        codes, labels = encode(df[dimension])
+        return codes, np.asarray(labels, dtype=object)
+    months, valid = month_codes(df['Sending Date'])
+    labels = np.unique(months[valid])
+    return np.where(valid, np.searchsorted(labels, months), -1), labels.astype('datetime64[M]')
+
+
+# Materialized cube over DIMENSIONS.
+# The cube is stored sparsely as its non-empty cells: one integer code array per
+# dimension (-1 for missing) and one array per measure. Every rollup (group-by
+# over a subset of the dimensions) small enough for DENSE_LIMIT is built as a
+# dense array indexed by code + 1 the first time a query needs it, so later
+# queries slice and sum a few thousand numbers instead of rescanning the rows,
+# and the intermediate cubes of merges and deltas never build any. Outbound
+# quantities are kept as bucketed (month, movement, value) counts for the
+# quantity histograms.
+class Cube:
+    __slots__ = ('labels', 'codes', 'measures', 'quantities', 'sizes', 'rollups')
+
+    def __init__(self, labels, codes, measures, quantities):
+        self.labels = labels
+        self.codes = codes
+        self.measures = measures
+        self.quantities = quantities
+        # Cells of every rollup that may be materialized, and the ones built so far
+        self.sizes = {}
+        self.rollups = {}
+        shape = [len(labels[d]) + 1 for d in DIMENSIONS]
+        for size in range(len(DIMENSIONS) + 1):
+            for dims in itertools.combinations(DIMENSIONS, size):
+                cells = int(np.prod([shape[DIMENSIONS.index(d)] for d in dims], dtype='int64'))
+                if cells <= DENSE_LIMIT:
+                    self.sizes[dims] = cells
+
+    # Dense `measure` array of a rollup, built on first use
+    def _rollup(self, dims, measure):
+        rollup = self.rollups.setdefault(dims, {})
+        if measure not in rollup:
+            sub_shape = [len(self.labels[d]) + 1 for d in dims]
+            keys = np.ravel_multi_index([self.codes[d] + 1 for d in dims], sub_shape) if dims \
+                else np.zeros(len(self.measures['rows']), dtype='int64')
+            rollup[measure] = np.bincount(keys, weights=self.measures[measure],
+                                          minlength=self.sizes[dims]).reshape(sub_shape)
+        return rollup[measure]
+
+    # Codes (+1, as rollup positions) selected by a where condition: a label, a
+    # list of labels, or for 'Month' a slice of months such as slice(None, '2024-08')
+    def _positions(self, dimension, condition):
+        labels = self.labels[dimension]
+        if dimension == 'Month' and isinstance(condition, slice):
+            start = 0 if condition.start is None else np.searchsorted(labels, np.datetime64(condition.start, 'M'))
+            stop = len(labels) if condition.stop is None else \
+                np.searchsorted(labels, np.datetime64(condition.stop, 'M'), side='right')
+            return np.arange(start, stop) + 1
+        values = condition if isinstance(condition, (list, tuple, set)) else [condition]
+        if dimension == 'Month':
+            values = [np.datetime64(v, 'M') for v in values]
+        lookup = {label: i for i, label in enumerate(labels)}
+        return np.array([lookup[v] + 1 for v in values if v in lookup], dtype='int64')
+
+    def _index(self, by, positions):
+        levels = []
+        for dimension, p in zip(by, positions):
+            labels = self.labels[dimension][p - 1]
+            levels.append(pd.DatetimeIndex(labels, name=dimension) if dimension == 'Month'
+                          else pd.Index(labels, name=dimension))
+        return levels[0] if len(levels) == 1 else pd.MultiIndex.from_arrays(levels)
+
+    # `measure` summed per combination of the `by` dimensions, over the cells
+    # matching `where` ({dimension: condition}). Missing values of a `by`
+    # dimension are left out, like a groupby; empty combinations are dropped.
+    # Returns a Series, or a number when `by` is empty.
+    def query(self, by=(), where=None, measure='rows'):
+        by = [d for d in DIMENSIONS if d in by]
+        where = where or {}
+        needed = set(by) | set(where)
+        dims = min((key for key in self.sizes if needed <= set(key)), key=self.sizes.get, default=None)
+        if dims is None:
+            return self._sparse_query(by, where, measure)
+
+        values = self._rollup(dims, measure)
+        for axis, dimension in reversed(list(enumerate(dims))):
+            if dimension in where:
+                values = np.take(values, self._positions(dimension, where[dimension]), axis=axis)
+                if dimension not in by:
+                    values = values.sum(axis=axis)
+            elif dimension in by:
+                values = np.take(values, np.arange(1, values.shape[axis]), axis=axis)
+            else:
+                values = values.sum(axis=axis)
+        if not by:
+            return values.item()
+
+        nonzero = np.nonzero(values)
+        positions = []
+        for axis, dimension in enumerate(by):
+            kept = self._positions(dimension, where[dimension]) if dimension in where \
+                else np.arange(1, len(self.labels[dimension]) + 1)
+            positions.append(kept[nonzero[axis]])
+        return pd.Series(values[nonzero], index=self._index(by, positions), name=measure)
+
+    # The same query answered from the cells, for rollups too large to materialize
+    def _sparse_query(self, by, where, measure):
+        keep = np.ones(len(self.measures[measure]), dtype=bool)
+        for dimension, condition in where.items():
+            keep &= np.isin(self.codes[dimension] + 1, self._positions(dimension, condition))
+        for dimension in by:
+            keep &= self.codes[dimension] >= 0
+        values = self.measures[measure][keep]
+        if not by:
+            return values.sum().item()
+        shape = [len(self.labels[d]) + 1 for d in by]
+        keys, inverse = np.unique(np.ravel_multi_index([self.codes[d][keep] + 1 for d in by], shape),
+                                  return_inverse=True)
+        sums = np.bincount(inverse, weights=values)
+        nonzero = sums != 0
+        positions = np.unravel_index(keys[nonzero], shape)
+        return pd.Series(sums[nonzero], index=self._index(by, positions), name=measure)
+
+    # Bucketed outbound (or inbound) quantity counts, optionally within a slice of months
+    def quantity_counts(self, movement='Outbound', months=None):
+        q = self.quantities
+        keep = np.isin(q['movement'] + 1, self._positions('Type Of Movement', movement))
+        if months is not None:
+            keep &= np.isin(q['month'] + 1, self._positions('Month', months))
+        return pd.Series(q['count'][keep], index=pd.Index(q['value'][keep], name='value'), name='count') \
+            .groupby(level='value').sum()
+
+    # The non-empty cells as a frame of dimension labels and measures
+    def cells(self):
+        frame = pd.DataFrame({d: pd.Series(self.labels[d]).reindex(self.codes[d]).to_numpy() for d in DIMENSIONS})
+        for m in MEASURES:
+            frame[m] = self.measures[m]
+        return frame
+
+
+# Cube of a loaded tracker frame: one combined code per row, counted with np.unique
+@traced('aggregate', rows=lambda cube: int(cube.measures['rows'].sum()))
+def build_cube(df):
+    encoded = {d: _encode_dimension(df, d) for d in DIMENSIONS}
+    labels = {d: encoded[d][1] for d in DIMENSIONS}
+    shape = [len(labels[d]) + 1 for d in DIMENSIONS]
+    keys, inverse = np.unique(np.ravel_multi_index([encoded[d][0] + 1 for d in DIMENSIONS], shape),
+                              return_inverse=True)
+    cells = np.unravel_index(keys, shape)
+    codes = {d: (cells[i] - 1).astype('int32') for i, d in enumerate(DIMENSIONS)}
+    cases = df["Qty's cases"].to_numpy(dtype='float64', na_value=np.nan)
+    measures = {
+        'rows': np.bincount(inverse, minlength=len(keys)).astype('float64'),
+        'cases': np.bincount(inverse, weights=np.nan_to_num(cases), minlength=len(keys)),
+    }
+
+    # Quantities per (month, movement, bucketed value)
+    has_quantity = ~np.isnan(cases)
+    month, movement = encoded['Month'][0][has_quantity], encoded['Type Of Movement'][0][has_quantity]
+    values, value_codes = np.unique(bucket_values(cases[has_quantity]), return_inverse=True)
+    q_shape = [len(labels['Month']) + 1, len(labels['Type Of Movement']) + 1, len(values)]
+    q_keys, q_counts = np.unique(np.ravel_multi_index([month + 1, movement + 1, value_codes], q_shape),
+                                 return_counts=True)
+    q_month, q_movement, q_value = np.unravel_index(q_keys, q_shape)
+    quantities = {'month': q_month - 1, 'movement': q_movement - 1, 'value': values[q_value], 'count': q_counts}
+    return Cube(labels, codes, measures, quantities)
+
+
+# One cube from several: labels are unioned and the cells of equal labels added.
+# Cells left with no rows (after adding a negate_cube) are dropped.
+def merge_cubes(cubes):
+    cubes = list(cubes)
+    if len(cubes) == 1:
+        return cubes[0]
+    labels = {}
+    for d in DIMENSIONS:
+        labels[d] = np.unique(np.concatenate([c.labels[d] for c in cubes]).astype(
+            'datetime64[M]' if d == 'Month' else str))
+        if d != 'Month':
+            labels[d] = labels[d].astype(object)
+
+    def recode(cube, dimension, codes):
+        mapping = np.append(np.searchsorted(labels[dimension], cube.labels[dimension].astype(
+            'datetime64[M]' if dimension == 'Month' else str)), -1)
+        return mapping[codes]
+
+    shape = [len(labels[d]) + 1 for d in DIMENSIONS]
+    keys = np.concatenate([np.ravel_multi_index([recode(c, d, c.codes[d]) + 1 for d in DIMENSIONS], shape)
+                           for c in cubes])
+    keys, inverse = np.unique(keys, return_inverse=True)
+    cells = np.unravel_index(keys, shape)
+    codes = {d: (cells[i] - 1).astype('int32') for i, d in enumerate(DIMENSIONS)}
+    measures = {m: np.bincount(inverse, weights=np.concatenate([c.measures[m] for c in cubes]),
+                               minlength=len(keys)) for m in MEASURES}
+    kept = measures['rows'] != 0
+    codes = {d: c[kept] for d, c in codes.items()}
+    measures = {m: v[kept] for m, v in measures.items()}
+
+    values = np.unique(np.concatenate([c.quantities['value'] for c in cubes]))
+    q_shape = [shape[0], shape[3], len(values)]
+    q_keys = np.concatenate([np.ravel_multi_index([
+        recode(c, 'Month', c.quantities['month']) + 1, recode(c, 'Type Of Movement', c.quantities['movement']) + 1,
+        np.searchsorted(values, c.quantities['value'])], q_shape) for c in cubes])
+    q_keys, q_inverse = np.unique(q_keys, return_inverse=True)
+    q_counts = np.bincount(q_inverse, weights=np.concatenate([c.quantities['count'] for c in cubes]))
+    q_keys, q_counts = q_keys[q_counts != 0], q_counts[q_counts != 0]
+    q_month, q_movement, q_value = np.unravel_index(q_keys, q_shape)
+    quantities = {'month': q_month - 1, 'movement': q_movement - 1, 'value': values[q_value],
+                  'count': q_counts.astype('int64')}
+    return Cube(labels, codes, measures, quantities)
+
+
+# The cube with every measure and quantity count negated: merging it takes its rows back out
+def negate_cube(cube):
+    quantities = dict(cube.quantities, count=-cube.quantities['count'])
+    return Cube(cube.labels, cube.codes, {m: -v for m, v in cube.measures.items()}, quantities)
+
+
+# Build the cube of a tracker file chunk by chunk, merging as it goes
+def build_cube_chunked(path=TRACKER_CSV, chunksize=DEFAULT_CHUNKSIZE):
+    cube = None
+    for chunk in iter_tracker_chunks(path, chunksize=chunksize, columns=CUBE_COLUMNS):
+        part = build_cube(chunk)
+        cube = part if cube is None else merge_cubes([cube, part])
+    return cube if cube is not None else build_cube(pd.DataFrame(columns=CUBE_COLUMNS))
+
+
+def save_cube(cube, path, meta=None):
+    arrays = {f'labels_{i}': cube.labels[d].astype('datetime64[M]' if d == 'Month' else str)
+              for i, d in enumerate(DIMENSIONS)}
+    arrays.update({f'codes_{i}': cube.codes[d] for i, d in enumerate(DIMENSIONS)})
+    arrays.update({f'measure_{m}': cube.measures[m] for m in MEASURES})
+    arrays.update({f'quantity_{k}': v for k, v in cube.quantities.items()})
+    arrays['meta'] = np.array(json.dumps(dict(meta or {}, version=CUBE_VERSION)))
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(path + '.tmp', path)
+
+
+# (cube, meta) from a saved cube, or (None, None) if it is missing or outdated
+def read_cube(path):
+    if not os.path.exists(path):
+        return None, None
+    with np.load(path) as data:
+        meta = json.loads(str(data['meta']))
+        if meta.get('version') != CUBE_VERSION:
+            return None, None
+        labels = {d: data[f'labels_{i}'] for i, d in enumerate(DIMENSIONS)}
+        labels = {d: v if d == 'Month' else v.astype(object) for d, v in labels.items()}
+        codes = {d: data[f'codes_{i}'] for i, d in enumerate(DIMENSIONS)}
+        measures = {m: data[f'measure_{m}'] for m in MEASURES}
+        quantities = {k: data[f'quantity_{k}'] for k in ['month', 'movement', 'value', 'count']}
+    return Cube(labels, codes, measures, quantities), meta
+
+
+def _cube_path(path, cache_dir):
+    return os.path.join(cache_dir, cache_name(path) + '.cube.npz')
+
+
+# Save the cube of a tracker file in the cache, stamped with the file's current signature
+def store_cube(cube, path, cache_dir=CACHE_DIR):
+    stat = os.stat(path)
+    save_cube(cube, _cube_path(path, cache_dir), {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                                  'sha256': file_hash(path)})
+
+
+# The cube of a tracker file (or of every file matched by a glob), rebuilt only
+# when a file changed: size and mtime are checked first, then the content hash
+@traced('load', rows=lambda cube: int(cube.measures['rows'].sum()))
+def load_cube(path=TRACKER_CSV, cache_dir=CACHE_DIR, chunksize=DEFAULT_CHUNKSIZE):
+    cubes = []
+    for file_path in expand_paths(path):
+        cube_path = _cube_path(file_path, cache_dir)
+        cube, meta = read_cube(cube_path)
+        stat = os.stat(file_path)
+        fresh = meta is not None and meta['size'] == stat.st_size and (
+            meta['mtime_ns'] == stat.st_mtime_ns or meta['sha256'] == file_hash(file_path))
+        if not fresh:
+            cube = build_cube_chunked(file_path, chunksize)
+            store_cube(cube, file_path, cache_dir)
+        cubes.append(cube)
+    return merge_cubes(cubes)
+
+
+# The reports' metrics (see aggregates.METRICS) answered from the cube, for
+# the months selected by `months`, e.g. slice(None, '2024-08') for up to August 2024
+def cube_metrics(cube, metrics, months=None):
+    where = {} if months is None else {'Month': months}
+    result = {}
+    if 'row_count' in metrics:
+        result['row_count'] = int(cube.query(where=where))
+    for metric, dimension in [('warehouse_counts', 'Warehouse'), ('status_counts', 'SR Statues')]:
+        if metric in metrics:
+            counts = cube.query([dimension], where).astype('int64').rename('count')
+            result[metric] = counts.sort_values(ascending=False, kind='stable')
+    if 'client_movement' in metrics:
+        table = cube.query(['Clients', 'Type Of Movement'], where).astype('int64')
+        result['client_movement'] = table.unstack(fill_value=0)
+    for metric, movement in [('monthly_outbound', 'Outbound'), ('monthly_inbound', 'Inbound')]:
+        if metric in metrics:
+            counts = cube.query(['Month'], dict(where, **{'Type Of Movement': movement})).astype('int64')
+            result[metric] = pd.DataFrame({'Sending Date': counts.index.rename(None), 'Count': counts.to_numpy()})
+    if 'outbound_qty_hist' in metrics:
+        quantities = cube.quantity_counts('Outbound', months)
+        result['outbound_qty_hist'] = None
+        if len(quantities):
+            counts, edges = np.histogram(quantities.index.to_numpy(), bins=HIST_BINS, weights=quantities.to_numpy())
+            result['outbound_qty_hist'] = (counts.astype('int64'), edges)
+    return result
+
+
+if __name__ == '__main__':
+    import sys
+
+    cube = load_cube(sys.argv[1] if len(sys.argv) > 1 else TRACKER_CSV)
+    print(f"{len(cube.measures['rows']):,} cells, {int(cube.measures['rows'].sum()):,} rows, "
+          f"{len(cube.sizes)} rollups small enough to materialize")
+    for dimension in DIMENSIONS:
+        if dimension != 'Clients':
+            print(f"\n{dimension}:")
+            print(cube.query([dimension]).astype('int64'))
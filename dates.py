@@ -0,0 +1,100 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from instrument import traced
+
+# Formats tried when detecting how a date column is written, in order of preference.
+# Month-first comes before day-first to match pd.to_datetime's default reading.
+CANDIDATE_FORMATS = [
+    '%m/%d/%Y',
+    '%d/%m/%Y',
+    '%Y-%m-%d',
+    '%d-%m-%Y',
+    '%m-%d-%Y',
+    '%d.%m.%Y',
+    '%m/%d/%y',
+    '%d/%m/%y',
+    '%d-%b-%Y',
+    '%d-%b-%y',
+    '%d %b %Y',
+    '%b %d, %Y',
+    '%Y/%m/%d',
+    '%Y-%m-%d %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%m/%d/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y %H:%M:%S',
+]
+
+# Unique values looked at when detecting the format
+SAMPLE_SIZE = 500
+
+
+# Pick the candidate format that parses the largest share of `values`.
+# Returns None when no candidate parses anything, so callers fall back to
+# pandas' per-value inference.
+def detect_format(values, sample_size=SAMPLE_SIZE):
+    sample = pd.Index(values).dropna().astype(str)
+    sample = sample[sample.str.strip() != '']
+    if len(sample) > sample_size:
+        sample = sample[np.linspace(0, len(sample) - 1, sample_size).astype(int)]
+    if not len(sample):
+        return None
+    best, best_parsed = None, 0
+    for fmt in CANDIDATE_FORMATS:
+        parsed = pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum()
+        if parsed > best_parsed:
+            best, best_parsed = fmt, parsed
+            if parsed == len(sample):
+                break
+    return best
+
+
+# Parse the distinct strings of a date column and map them back onto the rows.
+# The format is detected once (or taken from `fmt`) and only the unique values
+# are converted, so a column with a few hundred distinct dates over millions
+# of rows costs about one factorize. Values the format can't read get one
+# per-value inference pass; whatever still fails becomes NaT.
+# Returns the parsed Series and a report with the format used and the number
+# of non-empty values that could not be parsed.
+def parse_dates(series, fmt=None):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series, {'format': None, 'unique': None, 'unparsed': 0}
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+    else:
+        codes, uniques = pd.factorize(series)
+    uniques = pd.Index(uniques).astype(str)
+
+    if fmt is None:
+        fmt = detect_format(uniques)
+    if fmt is not None:
+        parsed = pd.to_datetime(uniques, format=fmt, errors='coerce')
+    else:
+        parsed = pd.DatetimeIndex([pd.NaT] * len(uniques))
+
+    missed = parsed.isna() & (uniques.str.strip() != '')
+    if missed.any():
+        parsed = parsed.where(~missed, pd.to_datetime(uniques.where(missed), format='mixed', errors='coerce'))
+
+    # Append NaT so missing rows (code -1) pick it up in the same take
+    lookup = np.append(parsed.to_numpy(), np.datetime64('NaT'))
+    result = pd.Series(lookup.take(codes), index=series.index, name=series.name)
+
+    failed = np.asarray(pd.isna(parsed) & (uniques.str.strip() != ''))
+    unparsed = 0
+    if failed.any():
+        unparsed = int(np.bincount(codes[codes >= 0], minlength=len(uniques))[failed].sum())
+    return result, {'format': fmt, 'unique': len(uniques), 'unparsed': unparsed}
+
+
+# parse_dates for a named column, warning when some values could not be parsed
+@traced('parse_dates', rows=lambda result: len(result[0]))
+def parse_date_column(df, column, fmt=None):
+    parsed, report = parse_dates(df[column], fmt)
+    if report['unparsed']:
+        warnings.warn(f"{report['unparsed']} values in '{column}' could not be parsed as dates")
+    return parsed, report
@@ -0,0 +1,218 @@
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from pptx import Presentation
+from pptx.util import Inches
+
+from charts import (plot_client_movements_bar, plot_inbound_outbound_pie, plot_outbound_over_time,
+                    plot_quantity_histogram, plot_status_bar, plot_top_warehouses_bar, plot_warehouse_pie)
+from instrument import traced
+from loader import TRACKER_CSV
+from render import figure_bytes, render_buffers, safe_name, worker_count
+from topk import top_clients, top_warehouses
+
+# Set DECK_TEMPLATE to a .pptx whose layouts (theme, logo, fonts) every deck should use
+TEMPLATE_ENV = 'DECK_TEMPLATE'
+
+# Metrics a deck needs from aggregates.compute_metrics
+DECK_METRICS = ['row_count', 'warehouse_counts', 'status_counts', 'monthly_outbound', 'monthly_inbound',
+                'outbound_qty_hist', 'client_movement']
+
+TOP_N = 10
+
+# The deck, slide by slide: (title, text, chart). The text is filled in with
+# deck_values(); chart names refer to deck_charts() and may be None.
+SLIDES = [
+    ("Introduction", "Objective: To analyze outbound movements and client activities using the Master Tracker data.\nData Source: {source}", None),
+    ("Data Cleaning and Preparation", "Steps Taken:\n- Loaded the CSV and normalized column names.\n- Filtered data to include records up to August 2024.", None),
+    ("Outbound Movements Overview", "Total Records Analyzed: {total_count}\nKey Metrics:\n- Number of outbound movements: {outbound_count} (inbound: {inbound_count}).\n- Breakdown by status and warehouse.", None),
+    ("Top 10 Warehouses by Order Count", "Bar Chart: Top 10 Warehouses by Order Count (Up to August 2024)", 'top_warehouses'),
+    ("Distribution of Orders by Top Warehouses", "Pie Chart: Distribution of Orders by Top 10 Warehouses (Up to August 2024)", 'warehouse_distribution'),
+    ("Orders by Status", "Bar Chart: Count of Orders by Status (Up to August 2024)", 'orders_by_status'),
+    ("Outbound Movements Over Time", "Line Chart: Outbound Movements Over Time (Up to August 2024)", 'outbound_over_time'),
+    ("Quantity Distribution for Outbound Movements", "Histogram: Distribution of Quantities for Outbound Movements (Up to August 2024)", 'quantity_distribution'),
+    ("Client Movement Analysis", "Top Clients Overview: Total inbound and outbound movements.", None),
+    ("Inbound and Outbound Movements by Top Clients", "Bar Chart: Top 10 Clients: Inbound and Outbound Movements (Up to August 2024)", 'top_clients'),
+    ("Total Inbound vs Outbound", "Pie Chart: Total Inbound vs Outbound Movements (Top Clients, Up to August 2024)", 'inbound_vs_outbound'),
+    # Suggestions for Further Analysis
+    ("Suggestions for Further Analysis", "- Implement advanced forecasting methods (e.g., ARIMA, exponential smoothing).\n- Analyze seasonal trends and their impact on outbound movements.\n- Explore correlations between order status and client behavior.", None),
+    # Potential Improvements
+    ("Potential Improvements", "- Automate data cleaning and visualization processes.\n- Integrate additional data sources for comprehensive analysis (e.g., client feedback, shipping delays).\n- Develop a dashboard for real-time monitoring of outbound movements.", None),
+    # Conclusion
+    ("Conclusion", "Summary of key findings.\nImportance of continuous monitoring and analysis for operational efficiency.", None),
+    # Questions
+    ("Questions", "Open the floor for any questions or discussions.", None),
+]
+
+
+# Values substituted into the slide texts
+def deck_values(metrics):
+    outbound = metrics['monthly_outbound']
+    inbound = metrics['monthly_inbound']
+    return {
+        'source': os.path.basename(TRACKER_CSV),
+        'total_count': f"{metrics['row_count']:,}",
+        'outbound_count': f"{int(outbound['Count'].sum()):,}",
+        'inbound_count': f"{int(inbound['Count'].sum()):,}",
+    }
+
+
+# The deck's charts as {name: (file name, plotting function, arguments)}, in slide order.
+# Charts without data (e.g. no outbound quantities for a client) are left out.
+def deck_charts(metrics):
+    top_n_warehouses = top_warehouses(metrics, TOP_N)
+    status_counts = metrics['status_counts']
+    outbound_counts = metrics['monthly_outbound']
+    filtered_movement_counts = top_clients(metrics, TOP_N)
+    totals = filtered_movement_counts.reindex(columns=['Inbound', 'Outbound'], fill_value=0).sum()
+
+    charts = {}
+    if len(top_n_warehouses):
+        charts['top_warehouses'] = (
+            'top_warehouses_bar_chart.png', plot_top_warehouses_bar,
+            (top_n_warehouses, f'Top {TOP_N} Warehouses by Order Count (Up to August 2024)'))
+        charts['warehouse_distribution'] = (
+            'warehouse_distribution_pie_chart.png', plot_warehouse_pie,
+            (top_n_warehouses, f'Distribution of Orders by Top {TOP_N} Warehouses (Up to August 2024)'))
+    if len(status_counts):
+        charts['orders_by_status'] = (
+            'orders_by_status_bar_chart.png', plot_status_bar,
+            (status_counts, 'Count of Orders by Status (Up to August 2024)'))
+    if len(outbound_counts):
+        charts['outbound_over_time'] = (
+            'outbound_movements_over_time.png', plot_outbound_over_time,
+            (outbound_counts, 'Outbound Movements Over Time (Up to August 2024)'))
+    if metrics['outbound_qty_hist'] is not None:
+        charts['quantity_distribution'] = (
+            'quantity_distribution_histogram.png', plot_quantity_histogram,
+            (metrics['outbound_qty_hist'], 'Distribution of Quantities for Outbound Movements (Up to August 2024)'))
+    if not filtered_movement_counts.empty:
+        charts['top_clients'] = (
+            'top_clients_movements_bar_chart.png', plot_client_movements_bar,
+            (filtered_movement_counts, f'Top {TOP_N} Clients: Inbound and Outbound Movements (Up to August 2024)'))
+    if totals.sum():
+        charts['inbound_vs_outbound'] = (
+            'inbound_vs_outbound_pie_chart.png', plot_inbound_outbound_pie,
+            (totals['Inbound'], totals['Outbound'],
+             'Total Inbound vs Outbound Movements (Top Clients, Up to August 2024)'))
+    return charts
+
+
+# An empty presentation on the shared template (DECK_TEMPLATE, or python-pptx's default)
+def new_presentation():
+    return Presentation(os.environ.get(TEMPLATE_ENV) or None)
+
+
+# Function to add a slide with a title and content.
+# `image` is a PNG as bytes (or a file path).
+def add_slide(prs, title, content, image=None):
+    slide_layout = prs.slide_layouts[1]  # Use the title and content layout
+    slide = prs.slides.add_slide(slide_layout)
+    title_placeholder = slide.shapes.title
+    content_placeholder = slide.placeholders[1]
+
+    title_placeholder.text = title
+    content_placeholder.text = content
+
+    if image:
+        left = Inches(1)
+        top = Inches(2.5)
+        if isinstance(image, bytes):
+            image = io.BytesIO(image)
+        slide.shapes.add_picture(image, left, top, width=Inches(8))
+
+
+# Assemble a deck from its metrics and chart images.
+# `images` maps chart names to PNG bytes; it is read in slide order, so it may
+# be a lazy mapping that waits for each chart. `scope` (e.g. 'Client: ACME')
+# is added to the title slide.
+def build_deck(metrics, images, scope=None):
+    prs = new_presentation()
+    values = deck_values(metrics)
+
+    # Title Slide
+    slide_layout = prs.slide_layouts[0]  # Use the title layout
+    slide = prs.slides.add_slide(slide_layout)
+    title = slide.shapes.title
+    subtitle = slide.placeholders[1]
+    title.text = "Analysis of Outbound Movements and Client Activity"
+    subtitle.text = "Insights from the Master Tracker 2024 Data\n" + (f"{scope}\n" if scope else "") + \
+        f"[Your Name]\n{date.today():%d %B %Y}"
+
+    # Add slides with content and charts
+    for slide_title, text, chart in SLIDES:
+        add_slide(prs, slide_title, text.format(**values), images.get(chart) if chart else None)
+    return prs
+
+
+# Charts rendered by render.render_buffers, exposed by name in slide order
+class _LazyImages:
+    def __init__(self, names, buffers):
+        self._names = iter(names)
+        self._buffers = buffers
+        self._ready = {}
+
+    def get(self, name):
+        while name not in self._ready:
+            try:
+                self._ready[next(self._names)] = next(self._buffers)
+            except StopIteration:
+                return None
+        return self._ready[name]
+
+
+# Render a deck's charts concurrently and assemble it while they complete
+def build_deck_concurrently(metrics, scope=None, workers=None):
+    charts = deck_charts(metrics)
+    images = _LazyImages(charts, render_buffers(list(charts.values()), workers))
+    return build_deck(metrics, images, scope)
+
+
+# File name of one partition's deck, e.g. 'Clients_ACME_Ltd.pptx'
+def deck_filename(by, value):
+    return f'{safe_name(by)}_{safe_name(value)}.pptx'
+
+
+# Deck file name of every partition value. Values that map to the same name
+# (e.g. 'ACME Ltd.' and 'ACME Ltd', or names differing only in case on
+# case-insensitive disks) get a short hash of the raw value appended, so no
+# deck overwrites another.
+def deck_filenames(by, values):
+    names = {value: deck_filename(by, value) for value in values}
+    taken = {}
+    for name in names.values():
+        taken[name.casefold()] = taken.get(name.casefold(), 0) + 1
+    for value, name in names.items():
+        if taken[name.casefold()] > 1:
+            digest = hashlib.sha1(str(value).encode()).hexdigest()[:8]
+            names[value] = f'{name[:-len(".pptx")]}_{digest}.pptx'
+    return names
+
+
+def _deck_job(job):
+    by, value, metrics, directory, filename = job
+    charts = deck_charts(metrics)
+    images = {name: figure_bytes(func, args) for name, (_, func, args) in charts.items()}
+    path = os.path.join(directory, filename)
+    build_deck(metrics, images, scope=f'{by}: {value}').save(path)
+    return path
+
+
+# Write one deck per partition into `directory`, in a process pool.
+# `partitions` is aggregates.compute_partitioned_metrics output. Each worker
+# draws its deck's charts in memory and saves the deck. Returns the paths.
+@traced('export', rows=len)
+def build_partition_decks(partitions, by, directory, workers=None):
+    os.makedirs(directory, exist_ok=True)
+    filenames = deck_filenames(by, partitions)
+    jobs = [(by, value, metrics, directory, filenames[value]) for value, metrics in partitions.items()]
+    if not jobs:
+        return []
+    workers = worker_count(workers, jobs)
+    if workers == 1:
+        return [_deck_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_deck_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
@@ -0,0 +1,226 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from instrument import traced
+
+# Months averaged by the moving-average forecast and months projected ahead
+MOVING_AVERAGE_MONTHS = 4
+FORECAST_MONTHS = 4
+
+
+# Month-end timestamps for a PeriodIndex, matching resample('M') labels
+def month_end(periods):
+    return periods.to_timestamp(how='end').normalize()
+
+
+# Item x month matrix of summed values over the full month range of the data.
+# Also returns a same-shaped boolean matrix of which (item, month) cells had rows.
+def item_month_matrix(df, date_column='Invoice Date', item_column='Item Name', value_column='Quantity'):
+    month = df[date_column].dt.to_period('M').rename(date_column)
+    grouped = df.groupby([df[item_column], month], observed=True)[value_column]
+    sums = grouped.sum().unstack(fill_value=0)
+    present = grouped.size().unstack(fill_value=0) > 0
+    if len(sums.columns):
+        months = pd.period_range(sums.columns.min(), sums.columns.max(), freq='M', name=date_column)
+        sums = sums.reindex(columns=months, fill_value=0)
+        present = present.reindex(columns=months, fill_value=False)
+    return sums, present
+
+
+# Forecast every item at once with the moving average the reports use:
+# the mean of each item's last `window` months (gaps inside its history
+# count as zero), projected `horizon` months past that item's last month.
+# Returns one tidy frame with the history rows (value_column set) followed
+# by the forecast rows ('Predicted <value_column>' set).
+@traced('forecast', rows=len)
+def forecast_items(df, date_column='Invoice Date', item_column='Item Name', value_column='Quantity',
+                   window=MOVING_AVERAGE_MONTHS, horizon=FORECAST_MONTHS):
+    predicted_column = f'Predicted {value_column}'
+    sums, present = item_month_matrix(df, date_column, item_column, value_column)
+    if sums.empty:
+        return pd.DataFrame(columns=[item_column, date_column, value_column, predicted_column])
+
+    values = sums.to_numpy()
+    observed = present.to_numpy()
+    n_items, n_months = values.shape
+    rows = np.arange(n_items)
+
+    # Each item's own first and last observed month
+    first = observed.argmax(axis=1)
+    last = n_months - 1 - observed[:, ::-1].argmax(axis=1)
+
+    # Window sums from cumulative sums: one vectorized lookup per item
+    cumulative = np.concatenate([np.zeros((n_items, 1)), np.cumsum(values, axis=1)], axis=1)
+    width = np.minimum(window, last - first + 1)
+    average = (cumulative[rows, last + 1] - cumulative[rows, last + 1 - width]) / width
+
+    months = sums.columns
+    items = sums.index
+
+    # History: every month from the item's first to its last observation
+    in_history = (np.arange(n_months) >= first[:, None]) & (np.arange(n_months) <= last[:, None])
+    item_idx, month_idx = np.nonzero(in_history)
+    history = pd.DataFrame({
+        item_column: items[item_idx],
+        date_column: month_end(months[month_idx]),
+        value_column: values[item_idx, month_idx],
+        predicted_column: np.nan,
+    })
+
+    # Forecast: `horizon` months after each item's last month
+    item_idx = np.repeat(rows, horizon)
+    steps = np.tile(np.arange(1, horizon + 1), n_items)
+    future_months = months[last[item_idx]] + steps
+    future = pd.DataFrame({
+        item_column: items[item_idx],
+        date_column: month_end(pd.PeriodIndex(future_months, freq='M')),
+        value_column: np.nan,
+        predicted_column: average[item_idx],
+    })
+
+    tidy = pd.concat([history, future], ignore_index=True)
+    return tidy.sort_values([item_column, date_column], kind='stable', ignore_index=True)
+
+
+# Models fitted by forecast_matrix
+MODELS = ['linear', 'moving_average', 'exp_smoothing']
+
+# Smoothing factor of the exponential smoothing model
+SMOOTHING_ALPHA = 0.3
+
+# Matrices with more cells than this are fitted in a process pool, in row chunks
+PARALLEL_CELLS = 2_000_000
+
+
+# Series x period matrix of summed values (row counts when value_column is None)
+# for the grand total and for every value of each column in `by`.
+# Rows are indexed by (Dimension, Series), e.g. ('Warehouse', 'WH1') or
+# ('Total', 'All'); columns are every period from the first to the last date.
+# Also returns a same-shaped boolean matrix of which cells had rows.
+def series_matrix(df, date_column, by=(), value_column=None, freq='D'):
+    period = df[date_column].dt.to_period(freq).rename(date_column)
+    values = df[value_column] if value_column else pd.Series(1, index=df.index)
+
+    sums, present = [], []
+    for dimension in ['Total', *by]:
+        keys = pd.Series('All', index=df.index) if dimension == 'Total' else df[dimension]
+        grouped = values.groupby([keys.rename('Series'), period], observed=True)
+        sums.append(pd.concat({dimension: grouped.sum().unstack(fill_value=0)}, names=['Dimension']))
+        present.append(pd.concat({dimension: grouped.size().unstack(fill_value=0) > 0}, names=['Dimension']))
+    sums = pd.concat(sums)
+    present = pd.concat(present)
+
+    if len(sums.columns):
+        periods = pd.period_range(sums.columns.min(), sums.columns.max(), freq=freq, name=date_column)
+        sums = sums.reindex(columns=periods, fill_value=0)
+        present = present.reindex(columns=periods, fill_value=False)
+    return sums.fillna(0).astype('float64'), present.fillna(False).astype(bool)
+
+
+# Position of each observed cell counted from the row's end: 1 = latest observation
+def _rank_from_end(observed):
+    return np.cumsum(observed[:, ::-1], axis=1)[:, ::-1]
+
+
+# Least-squares line through each row's observed cells, in closed form
+def _linear(values, observed, horizon):
+    t = np.arange(values.shape[1], dtype='float64')
+    y = np.where(observed, values, 0.0)
+    w = observed.astype('float64')
+    n = w.sum(axis=1)
+    sx, sxx = w @ t, w @ (t * t)
+    sy, sxy = y.sum(axis=1), y @ t
+    denominator = n * sxx - sx * sx
+    slope = np.divide(n * sxy - sx * sy, denominator, out=np.zeros_like(n), where=denominator > 0)
+    intercept = np.divide(sy - slope * sx, n, out=np.full_like(n, np.nan), where=n > 0)
+    future = len(t) - 1 + np.arange(1, horizon + 1)
+    return intercept[:, None] + slope[:, None] * future
+
+
+# Mean of each row's last `window` observed cells, held flat (the reports' scheme)
+def _moving_average(values, observed, horizon, window):
+    selected = observed & (_rank_from_end(observed) <= window)
+    count = selected.sum(axis=1)
+    total = np.where(selected, values, 0.0).sum(axis=1)
+    average = np.divide(total, count, out=np.full(len(count), np.nan), where=count > 0)
+    return np.repeat(average[:, None], horizon, axis=1)
+
+
+# Simple exponential smoothing over each row's observed cells, started at the
+# first observation. The final level is a weighted sum of the observations,
+# alpha * (1 - alpha)**(r - 1) for the r-th latest one, so no loop over time.
+def _exp_smoothing(values, observed, horizon, alpha):
+    rank = _rank_from_end(observed)
+    n = observed.sum(axis=1)
+    weights = np.where(observed, alpha * (1 - alpha) ** np.maximum(rank - 1, 0), 0.0)
+    first = observed & (rank == n[:, None])
+    weights = np.where(first, (1 - alpha) ** np.maximum(n[:, None] - 1, 0), weights)
+    level = (np.where(observed, values, 0.0) * weights).sum(axis=1)
+    level = np.where(n > 0, level, np.nan)
+    return np.repeat(level[:, None], horizon, axis=1)
+
+
+def _fit_chunk(job):
+    values, observed, horizon, models, window, alpha = job
+    fitted = {}
+    if 'linear' in models:
+        fitted['linear'] = _linear(values, observed, horizon)
+    if 'moving_average' in models:
+        fitted['moving_average'] = _moving_average(values, observed, horizon, window)
+    if 'exp_smoothing' in models:
+        fitted['exp_smoothing'] = _exp_smoothing(values, observed, horizon, alpha)
+    return fitted
+
+
+# Fit every model to every row of a series x period matrix at once.
+# Only observed cells are fitted; forecasts cover the `horizon` periods after
+# the matrix's last column. Returns {model: array of shape (series, horizon)}.
+# Large matrices are split into row chunks fitted in a process pool.
+def forecast_matrix(values, observed, horizon, models=MODELS, window=MOVING_AVERAGE_MONTHS,
+                    alpha=SMOOTHING_ALPHA, workers=None):
+    unknown = set(models) - set(MODELS)
+    if unknown:
+        raise ValueError(f"Unknown models: {sorted(unknown)}")
+    values = np.asarray(values, dtype='float64')
+    observed = np.asarray(observed, dtype=bool)
+
+    chunks = 1
+    if values.size > PARALLEL_CELLS:
+        chunks = min(workers or os.cpu_count() or 1, len(values))
+    if chunks <= 1:
+        return _fit_chunk((values, observed, horizon, models, window, alpha))
+
+    rows = np.array_split(np.arange(len(values)), chunks)
+    jobs = [(values[r], observed[r], horizon, models, window, alpha) for r in rows]
+    with ProcessPoolExecutor(max_workers=chunks) as pool:
+        parts = list(pool.map(_fit_chunk, jobs))
+    return {model: np.concatenate([part[model] for part in parts]) for model in models}
+
+
+# Forecast the total and every warehouse/client/... series of a frame with every model.
+# Returns a tidy frame: Dimension, Series, the forecast date and one column per model.
+# Monthly forecasts are dated at month end, like the reports' forecasts.
+@traced('forecast', rows=len)
+def forecast_series(df, date_column, by=(), value_column=None, freq='D', horizon=FORECAST_MONTHS,
+                    models=MODELS, window=MOVING_AVERAGE_MONTHS, alpha=SMOOTHING_ALPHA, workers=None):
+    sums, present = series_matrix(df, date_column, by, value_column, freq)
+    if sums.empty:
+        return pd.DataFrame(columns=['Dimension', 'Series', date_column, *models])
+    fitted = forecast_matrix(sums.to_numpy(), present.to_numpy(), horizon, models, window, alpha, workers)
+
+    future = sums.columns[-1] + np.arange(1, horizon + 1)
+    future = pd.PeriodIndex(future, freq=freq)
+    dates = month_end(future) if freq == 'M' else future.to_timestamp()
+
+    n_series = len(sums)
+    result = pd.DataFrame({
+        'Dimension': sums.index.get_level_values('Dimension').repeat(horizon),
+        'Series': sums.index.get_level_values('Series').repeat(horizon),
+        date_column: np.tile(dates, n_series),
+    })
+    for model in models:
+        result[model] = fitted[model].reshape(-1)
+    return result
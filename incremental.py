@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import pickle
+
+import pandas as pd
+
+from chunked import (DEFAULT_CHUNKSIZE, STREAMING_METRICS, finalize_aggregates, iter_tracker_chunks,
+                     merge_aggregates, metric_columns, partial_aggregates)
+from instrument import traced
+from loader import CACHE_DIR, TRACKER_CSV, cache_name, expand_paths
+
+# Set TRACKER_INCREMENTAL=1 to make all.py and Pre.py reuse the persisted aggregate state
+INCREMENTAL_ENV = 'TRACKER_INCREMENTAL'
+
+# Bumped whenever the layout of the saved state changes
+STATE_VERSION = 2
+
+
+def incremental_enabled():
+    return os.environ.get(INCREMENTAL_ENV, '') not in ('', '0')
+
+
+# Size of the file up to and including its last newline.
+# A row still being written at the end of the file is left for the next run.
+def complete_size(path, block_size=1 << 16):
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        position = size
+        while position > 0:
+            start = max(0, position - block_size)
+            f.seek(start)
+            block = f.read(position - start)
+            newline = block.rfind(b'\n')
+            if newline >= 0:
+                return start + newline + 1
+            position = start
+    return 0
+
+
+# Feed bytes [start, end) of the file into `digest`
+def _hash_range(digest, path, start, end, block_size=1 << 20):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        left = end - start
+        while left > 0:
+            block = f.read(min(block_size, left))
+            if not block:
+                break
+            digest.update(block)
+            left -= len(block)
+    return digest
+
+
+# One state file per source file and aggregate definition
+def _state_path(path, metrics, date_until, state_dir):
+    key = json.dumps({'metrics': sorted(metrics), 'date_until': str(date_until)}, sort_keys=True)
+    return os.path.join(state_dir, f"{cache_name(path)}.{hashlib.sha256(key.encode()).hexdigest()[:12]}.state.pkl")
+
+
+def _load_state(state_path):
+    if not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path, 'rb') as f:
+            state = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    return state if state.get('version') == STATE_VERSION else None
+
+
+def _save_state(state, state_path):
+    os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+
+# Bring the saved totals of one tracker file up to date.
+# The saved high-water mark is the byte offset of the last complete row, the
+# SHA-256 of every byte before it, the row count, the max Sending Date and the
+# detected date formats. When the file no longer starts with exactly those bytes
+# (earlier rows edited, deleted or reordered, or the header changed) the state
+# is rebuilt from row one.
+def update_file_state(path, metrics=STREAMING_METRICS, date_until=None, chunksize=DEFAULT_CHUNKSIZE,
+                      state_dir=CACHE_DIR):
+    state_path = _state_path(path, metrics, date_until, state_dir)
+    state = _load_state(state_path)
+    end = complete_size(path)
+    header = list(pd.read_csv(path, nrows=0).columns)
+
+    digest = hashlib.sha256()
+    mode = 'rebuild'
+    if state is not None and state['header'] == header and state['offset'] <= end:
+        _hash_range(digest, path, 0, state['offset'])
+        if digest.hexdigest() == state['prefix_sha256']:
+            mode = 'append' if state['offset'] < end else 'unchanged'
+        else:
+            digest = hashlib.sha256()
+
+    if mode == 'rebuild':
+        start, totals, rows, filtered_rows, max_date, date_formats = 0, {}, 0, 0, None, {}
+    else:
+        start, totals = state['offset'], state['totals']
+        rows, filtered_rows, max_date = state['rows'], state['filtered_rows'], state['max_date']
+        # Appended rows are parsed with the formats detected on the whole file, not re-detected
+        # from a few new rows (a day-first '05/03/2024' alone would be read as May 3rd)
+        date_formats = dict(state['date_formats'])
+
+    # 'Sending Date' is always read to keep the max-date high-water mark up to date
+    columns = sorted(set(metric_columns(metrics)) | {'Sending Date'})
+    new_rows = 0
+    for chunk in iter_tracker_chunks(path, chunksize=chunksize, columns=columns, start=start, end=end,
+                                     date_formats=date_formats):
+        new_rows += len(chunk)
+        chunk_max = chunk['Sending Date'].max()
+        if pd.notna(chunk_max) and (max_date is None or chunk_max > max_date):
+            max_date = chunk_max
+        if date_until is not None:
+            chunk = chunk[chunk['Sending Date'] <= date_until]
+        filtered_rows += len(chunk)
+        merge_aggregates(totals, partial_aggregates(chunk, metrics))
+
+    if mode != 'unchanged':
+        _hash_range(digest, path, start, end)
+        _save_state({
+            'version': STATE_VERSION,
+            'header': header,
+            'offset': end,
+            'prefix_sha256': digest.hexdigest(),
+            'rows': rows + new_rows,
+            'filtered_rows': filtered_rows,
+            'max_date': max_date,
+            'date_formats': date_formats,
+            'totals': totals,
+        }, state_path)
+
+    info = {'mode': mode, 'new_rows': new_rows, 'rows': rows + new_rows, 'filtered_rows': filtered_rows,
+            'max_date': max_date}
+    return totals, info
+
+
+# Aggregate the tracker (or every tracker matched by a glob), parsing only the
+# rows appended since the previous run
+@traced('aggregate', rows=lambda result: result['row_count'])
+def aggregate_tracker_incremental(path=TRACKER_CSV, metrics=STREAMING_METRICS, date_until=None,
+                                  chunksize=DEFAULT_CHUNKSIZE, state_dir=CACHE_DIR):
+    totals, infos = {}, []
+    for file_path in expand_paths(path):
+        file_totals, info = update_file_state(file_path, metrics, date_until, chunksize, state_dir)
+        merge_aggregates(totals, file_totals)
+        infos.append(info)
+
+    modes = {info['mode'] for info in infos}
+    result = finalize_aggregates(totals)
+    result['row_count'] = sum(info['filtered_rows'] for info in infos)
+    result['incremental'] = {
+        'mode': modes.pop() if len(modes) == 1 else 'mixed',
+        'new_rows': sum(info['new_rows'] for info in infos),
+        'rows': sum(info['rows'] for info in infos),
+        'max_date': max((info['max_date'] for info in infos if info['max_date'] is not None), default=None),
+        'files': infos,
+    }
+    return result
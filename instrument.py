@@ -0,0 +1,180 @@
+import atexit
+import json
+import os
+import sys
+import time
+from functools import wraps
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Set REPORT_TRACE=1 to trace a report run into trace_<script>.json, or set it
+# to a file path. The stage summary is printed when the script exits.
+TRACE_ENV = 'REPORT_TRACE'
+
+# Pipeline stages used across the reports (stages may nest, e.g. normalize inside load)
+STAGES = ['load', 'normalize', 'parse_dates', 'filter', 'aggregate', 'forecast', 'render', 'export']
+
+
+def _script_name():
+    return os.path.splitext(os.path.basename(sys.argv[0] or ''))[0] or 'python'
+
+
+# Where the trace goes, or None when tracing is off
+def trace_path():
+    value = os.environ.get(TRACE_ENV, '').strip()
+    if value in ('', '0'):
+        return None
+    if value == '1':
+        return f'trace_{_script_name()}.json'
+    return value
+
+
+_path = trace_path()
+_started = time.perf_counter()
+_events = []
+_open = []
+
+
+def enabled():
+    return _path is not None
+
+
+# Process high-water mark of resident memory in MB (None where unavailable)
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+
+class _Stage:
+    __slots__ = ('name', 'rows', '_wall', '_cpu', '_rss', '_children')
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self._children = 0.0
+        self._rss = peak_rss_mb()
+        _open.append(self)
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        _open.pop()
+        if _open:
+            _open[-1]._children += wall
+        rss = peak_rss_mb()
+        _events.append({
+            'stage': self.name,
+            'start': round(self._wall - _started, 6),
+            'wall': round(wall, 6),
+            'self': round(wall - self._children, 6),
+            'cpu': round(cpu, 6),
+            'peak_rss_mb': rss,
+            'rss_growth_mb': None if rss is None else round(rss - self._rss, 1),
+            'rows': self.rows,
+            'depth': len(_open),
+            'parent': _open[-1].name if _open else None,
+        })
+        return False
+
+
+# Returned when tracing is off: entering and setting .rows cost next to nothing
+class _NullStage:
+    __slots__ = ('rows',)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+# Time a block as one pipeline stage:
+#     with stage('filter') as s:
+#         df = df[...]
+#         s.rows = len(df)
+def stage(name, rows=None):
+    if _path is None:
+        return _NULL_STAGE
+    return _Stage(name, rows)
+
+
+# Decorator form of stage(). `rows` is an optional function of the result
+# giving its row count, e.g. traced('load', rows=len).
+def traced(name, rows=None):
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _path is None:
+                return func(*args, **kwargs)
+            with _Stage(name) as current:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    current.rows = rows(result)
+                return result
+        return wrapper
+    return decorate
+
+
+# Totals per stage, in order of first appearance.
+# 'self' excludes time spent in nested stages, so the self column adds up to the traced time.
+def summarize(events):
+    summary = {}
+    for event in events:
+        row = summary.setdefault(event['stage'], {'stage': event['stage'], 'calls': 0, 'wall': 0.0, 'self': 0.0,
+                                                  'cpu': 0.0, 'peak_rss_mb': None, 'rows': None})
+        row['calls'] += 1
+        for key in ('wall', 'self', 'cpu'):
+            row[key] = round(row[key] + event[key], 6)
+        if event['peak_rss_mb'] is not None:
+            row['peak_rss_mb'] = max(row['peak_rss_mb'] or 0, event['peak_rss_mb'])
+        if event['rows'] is not None:
+            row['rows'] = (row['rows'] or 0) + event['rows']
+    return list(summary.values())
+
+
+def format_summary(rows):
+    lines = [f"{'stage':<12}{'calls':>6}{'wall s':>10}{'self s':>10}{'cpu s':>10}{'peak MB':>10}{'rows':>12}"]
+    for row in rows:
+        peak = '' if row['peak_rss_mb'] is None else f"{row['peak_rss_mb']:.1f}"
+        count = '' if row['rows'] is None else f"{row['rows']:,}"
+        lines.append(f"{row['stage']:<12}{row['calls']:>6}{row['wall']:>10.3f}{row['self']:>10.3f}"
+                     f"{row['cpu']:>10.3f}{peak:>10}{count:>12}")
+    return '\n'.join(lines)
+
+
+def _write_trace():
+    summary = summarize(_events)
+    trace = {
+        'script': _script_name(),
+        'argv': sys.argv,
+        'total_wall': round(time.perf_counter() - _started, 6),
+        'total_cpu': round(time.process_time(), 6),
+        'peak_rss_mb': peak_rss_mb(),
+        'summary': summary,
+        'events': _events,
+    }
+    directory = os.path.dirname(_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(_path, 'w') as f:
+        json.dump(trace, f, indent=2, default=str)
+    print(f"\nStage timings ({trace['total_wall']:.3f}s total, trace in {_path}):", file=sys.stderr)
+    print(format_summary(summary), file=sys.stderr)
+
+
+if _path is not None:
+    atexit.register(_write_trace)
@@ -1,32 +1,31 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
+from charts import plot_item_forecast
+from forecast import forecast_items
+from loader import load_invoices
+from render import batch_mode, render_parallel, show
+from rollups import daily_rollup, rollup_view
 
-# Load the CSV file
-df = pd.read_csv('2024 invoices till July.csv')
-
-# Normalize column names by stripping whitespace
-df.columns = df.columns.str.strip()
+# Load the invoices (column names normalized and columns typed by the loader)
+df = load_invoices(report='invoice')
 
 # Check if 'Invoice Date' is in the DataFrame
 if 'Invoice Date' not in df.columns:
     print("'Invoice Date' column not found. Available columns are:")
     print(df.columns)
 else:
-    # Parse 'Invoice Date'
-    df['Invoice Date'] = pd.to_datetime(df['Invoice Date'], errors='coerce')
-
     # Check for missing values
     print("\nMissing Values:")
     print(df.isnull().sum())
 
-    # Convert 'Quantity' to numeric and drop NaN values
-    df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce')
+    # Drop rows without a quantity ('Quantity' is numeric from the schema)
     df = df.dropna(subset=['Quantity'])
 
+    # Roll the rows up to item x day once; the weekly and monthly tables and the forecasts are derived from it
+    daily_item_data = daily_rollup(df)
+
     # Monthly Breakdown by Item
-    monthly_item_data = df.groupby(['Item Name', pd.Grouper(key='Invoice Date', freq='M')])['Quantity'].sum().unstack(
-        fill_value=0)
+    monthly_item_data = rollup_view(daily_item_data, 'month')
 
     # Create a heatmap for monthly breakdown by item
     plt.figure(figsize=(12, 8))
@@ -41,11 +40,10 @@ else:
                rotation=45)
 
     plt.tight_layout()
-    plt.show()
+    show('monthly_item_heatmap')
 
     # Weekly Breakdown by Item
-    weekly_item_data = df.groupby(['Item Name', pd.Grouper(key='Invoice Date', freq='W')])['Quantity'].sum().unstack(
-        fill_value=0)
+    weekly_item_data = rollup_view(daily_item_data, 'week')
 
     # Create a heatmap for weekly breakdown by item
     plt.figure(figsize=(12, 8))
@@ -60,61 +58,20 @@ else:
                rotation=45)
 
     plt.tight_layout()
-    plt.show()
-
-    # Grouping by 'Invoice Date' and 'Item Name' for forecasting
-    item_monthly_counts = df.groupby(['Invoice Date', 'Item Name']).agg({'Quantity': 'sum'}).reset_index()
-
-    # Summarize monthly counts for each item
-    monthly_counts = item_monthly_counts.groupby(
-        ['Item Name', item_monthly_counts['Invoice Date'].dt.to_period('M')]).agg({'Quantity': 'sum'}).reset_index()
-
-    # Forecasting for each item
-    predictions = {}
-    for item in monthly_counts['Item Name'].unique():
-        item_data = monthly_counts[monthly_counts['Item Name'] == item]
-        if not item_data.empty:
-            item_data.loc[:, 'Invoice Date'] = item_data['Invoice Date'].dt.to_timestamp()
-
-            # Prepare for forecasting
-            item_monthly = item_data.set_index('Invoice Date').resample('M').sum().reset_index()
-            last_months_average = item_monthly['Quantity'].tail(4).mean()
-            future_dates = pd.date_range(start=item_monthly['Invoice Date'].max() + pd.offsets.MonthEnd(1), periods=4,
-                                         freq='M')
-            future_predictions = pd.DataFrame({'Invoice Date': future_dates, 'Predicted Quantity': last_months_average})
-
-            predictions[item] = pd.concat([item_monthly, future_predictions])
+    show('weekly_item_heatmap')
 
-    # Plotting predictions for each item
-    for item, pred_data in predictions.items():
-        plt.figure(figsize=(12, 6))
-
-        # Historical data
-        plt.plot(pred_data['Invoice Date'], pred_data['Quantity'], marker='o', label='Historical Data', color='orange',
-                 linestyle='-')
-
-        # Predicted data
-        plt.plot(pred_data['Invoice Date'], pred_data['Predicted Quantity'], linestyle='--', marker='o',
-                 label='Predicted Quantity', color='blue')
-
-        # Prepare combined data for connecting lines
-        historical_length = len(pred_data['Quantity'])
-        future_length = len(future_dates)
+    # Forecast every item in one vectorized pass (history plus next 4 months)
+    forecasts = forecast_items(daily_item_data)
+    predictions = {item: pred_data for item, pred_data in forecasts.groupby('Item Name', observed=True, sort=False)}
 
-        combined_dates = pd.concat([pred_data['Invoice Date'], pd.Series(future_dates)])
-        combined_data = pd.concat(
-            [pred_data['Quantity'], pd.Series([pred_data['Predicted Quantity'].iloc[0]] * future_length)])
-
-        # Connect the lines
-        plt.plot(combined_dates, combined_data, linestyle='-', color='blue', alpha=0.5)
-
-        plt.title(f'Forecast for {item}')
-        plt.xlabel('Date')
-        plt.ylabel('Quantity Sold')
-        plt.xticks(rotation=45)
-        plt.legend()
-        plt.tight_layout()
-        plt.show()
+    # Plotting predictions for each item; in batch mode the per-item charts render in parallel
+    if batch_mode():
+        render_parallel([(plot_item_forecast, (item, pred_data), f'forecast_{item}')
+                         for item, pred_data in predictions.items()])
+    else:
+        for item, pred_data in predictions.items():
+            plot_item_forecast(item, pred_data)
+            plt.show()
 
     # Bar chart for predicted quantities
     predicted_totals = {}
@@ -129,7 +86,7 @@ else:
     plt.ylabel('Total Predicted Quantity')
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.show()
+    show('predicted_totals_bar_chart')
 
     # General distribution of quantities for all items
     if 'Quantity' in df.columns and not df['Quantity'].empty:
@@ -139,6 +96,6 @@ else:
         plt.xlabel('Quantity of Cases')
         plt.ylabel('Frequency')
         plt.tight_layout()
-        plt.show()
+        show('invoice_quantity_distribution_histogram')
     else:
         print("Column 'Quantity' not found or contains no data in the invoices.")
\ No newline at end of file
@@ -0,0 +1,325 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from instrument import traced
+from schema import INVOICE_SCHEMA, TRACKER_SCHEMA, apply_schema, canonical_name, read_dtypes, report_columns
+
+# Default input files used by the reports.
+# TRACKER_FILES may name a glob such as 'trackers/Master Tracker * (Movement).csv'
+# to load one tracker per year and per site together.
+TRACKER_CSV = os.environ.get('TRACKER_FILES', 'Master Tracker 2024 krk(Movement).csv')
+INVOICE_CSV = '2024 invoices till July.csv'
+
+# Column added when several files are loaded together, naming the file each row came from
+SOURCE_COLUMN = 'Source File'
+
+# Folder holding the normalized columnar copies of the CSV files
+CACHE_DIR = '.cache'
+
+# Date column each file's cached copy is partitioned on, one Parquet file per month
+TRACKER_PARTITION = 'Sending Date'
+INVOICE_PARTITION = 'Invoice Date'
+
+# Partition of the rows without a date (and of every row when nothing is partitioned)
+UNDATED = 'undated'
+
+
+# Hash the file contents in blocks so large trackers don't have to fit in memory
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Strip column names (mapping them onto `schema` names when given) and
+# rename duplicated columns with a '_dup' suffix
+def normalize_columns(df, schema=None):
+    if schema is None:
+        df.columns = df.columns.str.strip()
+    else:
+        df.columns = [canonical_name(column, schema) for column in df.columns]
+    if df.columns.duplicated().any():
+        df.columns = pd.Series(df.columns).where(~df.columns.duplicated(), df.columns + '_dup')
+    return df
+
+
+# Fold each '<name>_dup' column into '<name>', keeping the first non-missing value per row
+def coalesce_duplicates(df):
+    for dup in [c for c in df.columns if c.endswith('_dup') and c[:-len('_dup')] in df.columns]:
+        base = dup[:-len('_dup')]
+        first, second = df[base], df[dup]
+        if isinstance(first.dtype, pd.CategoricalDtype) or isinstance(second.dtype, pd.CategoricalDtype):
+            first, second = first.astype(object), second.astype(object)
+        df[base] = first.where(first.notna(), second)
+        df = df.drop(columns=dup)
+    return df
+
+
+# Raw header names to pass as read_csv(usecols=...) for the wanted schema columns
+def raw_usecols(header, schema, columns):
+    if columns is None:
+        return None
+    return [raw for raw in header if canonical_name(raw, schema) in columns]
+
+
+# Normalize, reconcile and type a frame freshly read from CSV
+@traced('normalize', rows=len)
+def finish_frame(df, schema, date_formats=None):
+    return apply_schema(coalesce_duplicates(normalize_columns(df, schema)), schema, date_formats)
+
+
+# Read a CSV with the schema applied, materializing only `columns` (schema names)
+def read_typed_csv(path, schema, columns=None):
+    header = pd.read_csv(path, nrows=0).columns
+    df = pd.read_csv(path, usecols=raw_usecols(header, schema, columns), dtype=read_dtypes(header, schema))
+    return finish_frame(df, schema)
+
+
+# Cache file stem: the file name plus a hash of its full path, so same-named
+# trackers in different site folders don't share a cache entry
+def cache_name(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return f"{name}.{hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]}"
+
+
+def _cache_paths(path, cache_dir):
+    name = cache_name(path)
+    return os.path.join(cache_dir, name), os.path.join(cache_dir, name + '.json')
+
+
+# Identifies the schema a cache file was written with, so schema edits force a rebuild
+def _schema_key(schema):
+    return hashlib.sha256(json.dumps(schema, sort_keys=True).encode()).hexdigest()
+
+
+# Return the cache metadata if the cached copy still matches the source file.
+# Size and mtime are compared first; the content hash is only computed when
+# they disagree, so a touched-but-unchanged file does not force a rebuild.
+# The second value is the content hash when it had to be computed.
+def _fresh_meta(path, meta_path, schema_key):
+    if not os.path.exists(meta_path):
+        return None, None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    stat = os.stat(path)
+    if meta.get('size') != stat.st_size or meta.get('schema') != schema_key:
+        return None, None
+    if meta.get('mtime_ns') == stat.st_mtime_ns:
+        return meta, meta['sha256']
+    digest = file_hash(path)
+    if meta.get('sha256') != digest:
+        return None, digest
+    meta['mtime_ns'] = stat.st_mtime_ns
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return meta, digest
+
+
+# Split a frame into its month partitions ('YYYY-MM' -> rows), keeping the row labels
+def month_partitions(df, partition_by):
+    if partition_by is None or partition_by not in df.columns:
+        return {UNDATED: df}
+    months = df[partition_by].dt.to_period('M')
+    partitions = {UNDATED if pd.isna(month) else str(month): part
+                  for month, part in df.groupby(months, sort=True, dropna=False, observed=True)}
+    return partitions or {UNDATED: df}
+
+
+# Write the cached copy as a folder of month partitions plus the metadata that validates it.
+# Each partition keeps the original row numbers as its index, so reads can restore file order.
+def _write_cache(df, path, data_path, meta_path, schema_key, digest=None, partition_by=None):
+    stat = os.stat(path)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    shutil.rmtree(data_path, ignore_errors=True)
+    # Single-file copy written before the cache was partitioned
+    if os.path.exists(data_path + '.parquet'):
+        os.remove(data_path + '.parquet')
+    os.makedirs(data_path)
+    partitions = month_partitions(df, partition_by)
+    for key, part in partitions.items():
+        part.to_parquet(os.path.join(data_path, key + '.parquet'), index=True)
+    meta = {
+        'source': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': digest or file_hash(path),
+        'schema': schema_key,
+        'columns': list(df.columns),
+        'partition_by': partition_by,
+        'partitions': {key: len(part) for key, part in partitions.items()},
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+
+
+# Keep only the requested columns that exist, in file order
+def _select(available, columns):
+    if columns is None:
+        return list(available)
+    return [c for c in available if c in columns]
+
+
+# Month partitions that can hold rows dated between date_from and date_until
+# (inclusive, either may be None). Undated rows only match an unfiltered read.
+def select_partitions(partitions, date_from=None, date_until=None):
+    if date_from is None and date_until is None:
+        return list(partitions)
+    low = pd.Timestamp(date_from).strftime('%Y-%m') if date_from is not None else None
+    high = pd.Timestamp(date_until).strftime('%Y-%m') if date_until is not None else None
+    return [key for key in partitions
+            if key != UNDATED and (low is None or key >= low) and (high is None or key <= high)]
+
+
+# Rows whose `column` date lies between date_from and date_until (inclusive, either may be None)
+def filter_dates(df, column, date_from=None, date_until=None):
+    if date_from is None and date_until is None:
+        return df
+    if column is None:
+        raise ValueError('A date range needs a partition column to filter on')
+    mask = pd.Series(True, index=df.index)
+    if date_from is not None:
+        mask &= df[column] >= date_from
+    if date_until is not None:
+        mask &= df[column] <= date_until
+    return df[mask]
+
+
+# Read the month partitions a date range needs, in the file's row order.
+# A full read gets a fresh RangeIndex; a filtered read keeps the file's row
+# numbers, like boolean indexing of the full frame would.
+def _read_partitions(data_path, meta, columns, date_from, date_until):
+    partition_by = meta['partition_by']
+    keys = select_partitions(meta['partitions'], date_from, date_until)
+    filtered = date_from is not None or date_until is not None
+    wanted = _select(meta['columns'], columns)
+    read = wanted + [partition_by] if filtered and partition_by not in wanted else wanted
+    # With no matching month, one partition still supplies the columns and their types
+    frames = [pd.read_parquet(os.path.join(data_path, key + '.parquet'), columns=read)
+              for key in keys or list(meta['partitions'])[:1]]
+    df = concat_frames(frames, ignore_index=False)
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    if not filtered:
+        return df.reset_index(drop=True)
+    return filter_dates(df, partition_by, date_from, date_until)[wanted]
+
+
+# Load a CSV through the columnar cache.
+# The cache always holds every column, split by month of `partition_by`;
+# `columns` is pushed down to the Parquet read so only the requested columns
+# are materialized, and a date_from/date_until range (inclusive) only reads
+# the months it overlaps.
+def load_cached(path, schema, columns=None, cache_dir=CACHE_DIR, use_cache=True, partition_by=None,
+                date_from=None, date_until=None):
+    if not use_cache:
+        filtered = date_from is not None or date_until is not None
+        read = list(columns) + [partition_by] if columns is not None and filtered else columns
+        df = filter_dates(read_typed_csv(path, schema, read), partition_by, date_from, date_until)
+        return df[_select(df.columns, columns)]
+
+    schema_key = _schema_key(schema)
+    data_path, meta_path = _cache_paths(path, cache_dir)
+    meta, digest = _fresh_meta(path, meta_path, schema_key)
+    if (meta is not None and meta.get('partition_by') == partition_by and 'partitions' in meta
+            and os.path.isdir(data_path)):
+        return _read_partitions(data_path, meta, columns, date_from, date_until)
+
+    df = read_typed_csv(path, schema)
+    try:
+        _write_cache(df, path, data_path, meta_path, schema_key, digest=digest, partition_by=partition_by)
+    except (ImportError, TypeError, ValueError):
+        # No Parquet engine installed or a column Parquet can't store, keep working without the cache
+        pass
+    df = filter_dates(df, partition_by, date_from, date_until)
+    return df[_select(df.columns, columns)]
+
+
+def is_glob(path):
+    return any(ch in path for ch in '*?[')
+
+
+# Files named by `pattern`: the path itself, or every match of a glob in sorted order
+def expand_paths(pattern):
+    if not is_glob(pattern):
+        return [pattern]
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise FileNotFoundError(f"No files match {pattern!r}")
+    return paths
+
+
+# Concatenate frames, unioning categorical columns so they stay categorical
+def concat_frames(frames, ignore_index=True):
+    frames = [f for f in frames if len(f.columns)]
+    if not frames:
+        return pd.DataFrame()
+    for column in {c for f in frames for c in f.columns}:
+        parts = [f[column] for f in frames if column in f.columns]
+        if len(parts) == len(frames) and all(isinstance(p.dtype, pd.CategoricalDtype) for p in parts):
+            categories = union_categoricals(parts, ignore_order=True).categories
+            for f in frames:
+                f[column] = f[column].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=ignore_index)
+
+
+def _load_file(args):
+    path, schema, columns, cache_dir, use_cache, partition_by, date_from, date_until = args
+    return load_cached(path, schema, columns=columns, cache_dir=cache_dir, use_cache=use_cache,
+                       partition_by=partition_by, date_from=date_from, date_until=date_until)
+
+
+# Load every file matched by `pattern`, parsing them in a process pool.
+# Column names are reconciled against the schema in each worker and the
+# results are concatenated with a SOURCE_COLUMN naming the original file.
+def load_many(pattern, schema, columns=None, cache_dir=CACHE_DIR, use_cache=True, workers=None, partition_by=None,
+              date_from=None, date_until=None):
+    paths = expand_paths(pattern)
+    jobs = [(path, schema, columns, cache_dir, use_cache, partition_by, date_from, date_until) for path in paths]
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(_load_file, jobs))
+    else:
+        frames = [_load_file(job) for job in jobs]
+    for path, frame in zip(paths, frames):
+        frame[SOURCE_COLUMN] = pd.Categorical([path] * len(frame), categories=[path])
+    return concat_frames(frames)
+
+
+# Load the movement tracker, typed per TRACKER_SCHEMA.
+# Pass `report` (e.g. 'Pre') to materialize only the columns that report uses,
+# and date_from/date_until (inclusive) to read only the Sending Date months in range.
+# `path` may be a glob, in which case every matching tracker is loaded in parallel.
+@traced('load', rows=len)
+def load_tracker(path=TRACKER_CSV, report=None, columns=None, cache_dir=CACHE_DIR, use_cache=True, workers=None,
+                 date_from=None, date_until=None):
+    if columns is None:
+        columns = report_columns(report)
+    options = dict(columns=columns, cache_dir=cache_dir, use_cache=use_cache, partition_by=TRACKER_PARTITION,
+                   date_from=date_from, date_until=date_until)
+    if is_glob(path):
+        return load_many(path, TRACKER_SCHEMA, workers=workers, **options)
+    return load_cached(path, TRACKER_SCHEMA, **options)
+
+
+# Load the invoice export, typed per INVOICE_SCHEMA; a date range reads only the Invoice Date months in range
+@traced('load', rows=len)
+def load_invoices(path=INVOICE_CSV, report=None, columns=None, cache_dir=CACHE_DIR, use_cache=True, workers=None,
+                  date_from=None, date_until=None):
+    if columns is None:
+        columns = report_columns(report)
+    options = dict(columns=columns, cache_dir=cache_dir, use_cache=use_cache, partition_by=INVOICE_PARTITION,
+                   date_from=date_from, date_until=date_until)
+    if is_glob(path):
+        return load_many(path, INVOICE_SCHEMA, workers=workers, **options)
+    return load_cached(path, INVOICE_SCHEMA, **options)
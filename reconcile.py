@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+from instrument import traced
+
+# Columns that identify one shipment when the tracker logs its 'Sent' and
+# 'Received' events as separate rows. The tracker has no order number, so a
+# shipment is its client, warehouse, movement type, sending date and quantity.
+MATCH_KEYS = ['Clients', 'Warehouse', 'Type Of Movement', 'Sending Date', "Qty's cases"]
+
+SENT = 'Sent'
+RECEIVED = 'Received'
+
+TRANSIT_QUANTILES = [0.5, 0.95, 0.99]
+
+
+def _days(delta):
+    return delta / np.timedelta64(1, 'D')
+
+
+# One int64 code per distinct combination of the key columns (missing values included).
+# Column codes are combined as mixed-radix digits; categoricals reuse their codes.
+def _key_codes(frame):
+    combined = np.zeros(len(frame), dtype='int64')
+    radix = 1
+    for column in frame.columns:
+        series = frame[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes, size = series.cat.codes.to_numpy().astype('int64') + 1, len(series.cat.categories) + 1
+        else:
+            codes, uniques = pd.factorize(series, use_na_sentinel=False)
+            codes, size = codes.astype('int64'), max(len(uniques), 1)
+        if radix * size >= 1 << 62:
+            # Renumber the digits so far densely before they overflow
+            _, combined = np.unique(combined, return_inverse=True)
+            radix = int(combined.max(initial=0)) + 1
+        combined = combined * size + codes
+        radix *= size
+    return combined
+
+
+# Pair the k-th sent row of every key with its k-th received row, with one stable sort.
+# Sorting the sent codes followed by the received codes keeps, within each key,
+# the sent rows first and both sides in file order, so partners sit a fixed
+# distance apart: position start + k pairs with start + n_sent + k.
+# Returns the matched positions into sent_codes and into received_codes.
+def _pair_rows(sent_codes, received_codes):
+    codes = np.concatenate([sent_codes, received_codes])
+    order = np.argsort(codes, kind='stable')
+    ordered = codes[order]
+    is_sent = order < len(sent_codes)
+
+    positions = np.arange(len(codes))
+    starts = np.ones(len(codes), dtype=bool)
+    starts[1:] = ordered[1:] != ordered[:-1]
+    group_start = np.maximum.accumulate(np.where(starts, positions, 0))
+    group_end = np.append(np.flatnonzero(starts)[1:], len(codes))[np.cumsum(starts) - 1]
+    sent_before = np.concatenate([[0], np.cumsum(is_sent)])
+    n_sent = sent_before[group_end] - sent_before[group_start]
+    n_received = (group_end - group_start) - n_sent
+
+    occurrence = positions - group_start
+    paired = is_sent & (occurrence < n_received)
+    sent_positions = positions[paired]
+    received_positions = group_start[paired] + n_sent[paired] + occurrence[paired]
+    return order[sent_positions], order[received_positions] - len(sent_codes)
+
+
+# Match 'Sent' rows to 'Received' rows with equal keys and measure transit times.
+# Rows sharing a key are paired in file order (first sent with first received,
+# and so on). Keys are combined into one integer code per row and both sides
+# are joined with a single sort-merge, so millions of rows take about a second.
+# Returns a dict of frames:
+#   'shipments'   -> every received shipment: matched pairs, plus received rows
+#                    without a sent row (transit from their own dates), with transit_days
+#   'outstanding' -> sent rows with no received row, oldest first, with age_days
+#                    counted up to `as_of` (default: the latest date in the tracker)
+@traced('aggregate', rows=lambda result: len(result['shipments']) + len(result['outstanding']))
+def reconcile(df, keys=MATCH_KEYS, as_of=None, status_column='SR Statues'):
+    keys = [key for key in keys if key in df.columns]
+    status = df[status_column]
+    sent_rows = np.flatnonzero((status == SENT).to_numpy())
+    received_rows = np.flatnonzero((status == RECEIVED).to_numpy())
+
+    codes = _key_codes(df[keys])
+    sent_match, received_match = _pair_rows(codes[sent_rows], codes[received_rows])
+
+    sending = df['Sending Date'].to_numpy()
+    receiving = df['Receiving Date'].to_numpy()
+
+    # Matched pairs: sent on the sent row, received on the received row
+    matched_sent = sent_rows[sent_match]
+    matched_received = received_rows[received_match]
+    # Received rows without a sent row carry both dates themselves
+    standalone = np.delete(received_rows, received_match)
+
+    shipments = df.iloc[np.concatenate([matched_received, standalone])][keys].reset_index(drop=True)
+    shipments['Sending Date'] = np.concatenate([sending[matched_sent], sending[standalone]])
+    shipments['Receiving Date'] = np.concatenate([receiving[matched_received], receiving[standalone]])
+    shipments['matched'] = np.arange(len(shipments)) < len(matched_received)
+    shipments['sent_row'] = np.concatenate([df.index[matched_sent], np.full(len(standalone), -1)])
+    shipments['received_row'] = df.index[np.concatenate([matched_received, standalone])]
+    shipments['transit_days'] = _days(shipments['Receiving Date'] - shipments['Sending Date'])
+
+    if as_of is None:
+        as_of = max(df['Sending Date'].max(), df['Receiving Date'].max())
+    as_of = pd.Timestamp(as_of)
+    outstanding_rows = np.delete(sent_rows, sent_match)
+    outstanding = df.iloc[outstanding_rows][keys].copy()
+    outstanding['sent_row'] = df.index[outstanding_rows]
+    outstanding['age_days'] = _days(as_of - outstanding['Sending Date'])
+    outstanding = outstanding.sort_values('age_days', ascending=False, kind='stable', na_position='last')
+
+    return {'shipments': shipments, 'outstanding': outstanding.reset_index(drop=True), 'as_of': as_of}
+
+
+# Transit-time statistics (days) of the received shipments, overall or per `by` column.
+# Negative transit times (received before sent) are counted separately as data errors.
+def transit_summary(shipments, by=None):
+    valid = shipments[shipments['transit_days'] >= 0]
+    if by is None:
+        transit = valid['transit_days']
+        stats = {'shipments': len(shipments), 'with_dates': int(shipments['transit_days'].notna().sum()),
+                 'negative': int((shipments['transit_days'] < 0).sum()), 'mean': transit.mean()}
+        stats.update({f'p{int(q * 100)}': transit.quantile(q) for q in TRANSIT_QUANTILES})
+        return pd.Series(stats)
+    grouped = valid.groupby(by, observed=True)['transit_days']
+    summary = grouped.agg(['count', 'mean'])
+    for q in TRANSIT_QUANTILES:
+        summary[f'p{int(q * 100)}'] = grouped.quantile(q)
+    return summary.sort_values('count', ascending=False)
+
+
+# Outstanding (sent, never received) shipments per `by` column with their oldest age
+def outstanding_summary(outstanding, by='Warehouse'):
+    return outstanding.groupby(by, observed=True)['age_days'].agg(['count', 'max', 'median']) \
+        .sort_values('count', ascending=False)
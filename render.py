@@ -0,0 +1,296 @@
+import atexit
+import hashlib
+import inspect
+import io
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+from instrument import traced
+
+# Set REPORT_OUTPUT_DIR to run the reports headless: every figure is written
+# to that folder as PNG instead of being shown in a window
+OUTPUT_DIR_ENV = 'REPORT_OUTPUT_DIR'
+
+# Set REPORT_WORKERS to cap the processes used for parallel rendering
+WORKERS_ENV = 'REPORT_WORKERS'
+
+DPI = 100
+
+# Written next to cached charts, recording each chart's key, the SHA-256 of the
+# PNG written for it and whether the last render was a hit
+MANIFEST_NAME = 'chart_manifest.json'
+
+
+def output_dir():
+    return os.environ.get(OUTPUT_DIR_ENV) or None
+
+
+def batch_mode():
+    return output_dir() is not None
+
+
+# Force the non-interactive backend so nothing tries to open a window
+if batch_mode():
+    matplotlib.use('Agg', force=True)
+
+import matplotlib.pyplot as plt  # noqa: E402  (backend has to be chosen first)
+
+
+# File-system safe version of a name, e.g. 'Forecast for A/B' -> 'Forecast_for_A_B'
+def safe_name(name):
+    return re.sub(r'[^\w.-]+', '_', str(name)).strip('_')
+
+
+def figure_filename(name):
+    return safe_name(name) + '.png'
+
+
+# Save the current figure into `directory` and close it
+def save_figure(name, directory):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, figure_filename(name))
+    plt.savefig(path, dpi=DPI)
+    plt.close()
+    return path
+
+
+# Drop-in replacement for plt.show(): in batch mode the current figure is
+# written to the output folder as `<name>.png`, otherwise it is shown as before
+@traced('render')
+def show(name):
+    if batch_mode():
+        return save_figure(name, output_dir())
+    plt.show()
+    return None
+
+
+def _render_job(job):
+    func, args, name, directory = job
+    matplotlib.use('Agg', force=True)
+    func(*args)
+    return save_figure(name, directory)
+
+
+def worker_count(workers, jobs):
+    if workers is None:
+        workers = int(os.environ.get(WORKERS_ENV) or 0) or os.cpu_count() or 1
+    return max(1, min(workers, len(jobs)))
+
+
+# Render independent figures in a process pool.
+# `jobs` is a list of (func, args, name): each worker calls func(*args) to draw
+# on a fresh figure and saves it as `<name>.png` in `directory`. `func` must be
+# importable (defined at module level), since it is sent to the workers.
+# Returns the written paths in job order.
+@traced('render')
+def render_parallel(jobs, directory=None, workers=None):
+    directory = directory or output_dir()
+    if directory is None:
+        raise ValueError(f"render_parallel needs a directory or {OUTPUT_DIR_ENV} to be set")
+    tasks = [(func, args, name, directory) for func, args, name in jobs]
+    workers = worker_count(workers, tasks)
+    if workers == 1:
+        return [_render_job(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_render_job, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+
+
+# Feed a chart input into `digest`: frames and series by content, arrays by bytes
+def _update_digest(digest, value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest.update(repr((type(value).__name__, value.shape, getattr(value, 'name', None))).encode())
+        digest.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else []).encode())
+        digest.update(repr(list(value.dtypes) if isinstance(value, pd.DataFrame) else value.dtype).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Index):
+        _update_digest(digest, value.to_series())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype.str, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'{type(value).__name__}:{len(value)}'.encode())
+        for item in value:
+            _update_digest(digest, item)
+    elif isinstance(value, dict):
+        for key in sorted(value, key=repr):
+            digest.update(repr(key).encode())
+            _update_digest(digest, value[key])
+    else:
+        digest.update(repr(value).encode())
+
+
+# Content key of a chart: the plotting function's source (all styling lives
+# there), its inputs, and the settings that change the written file
+def chart_key(func, args=(), kwargs=None):
+    digest = hashlib.sha256()
+    digest.update(f'{func.__module__}.{func.__qualname__}'.encode())
+    digest.update(inspect.getsource(func).encode())
+    digest.update(repr((matplotlib.__version__, DPI)).encode())
+    _update_digest(digest, tuple(args))
+    _update_digest(digest, kwargs or {})
+    return digest.hexdigest()
+
+
+# Per-directory manifests, loaded once per process and written back by write_manifests
+_manifests = {}
+_run_counts = {}
+_changed = set()
+
+
+def _manifest(directory):
+    if directory not in _manifests:
+        path = os.path.join(directory, MANIFEST_NAME)
+        manifest = {'charts': {}}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                pass
+        _manifests[directory] = manifest
+        _run_counts[directory] = {'hits': 0, 'misses': 0}
+    return _manifests[directory]
+
+
+# Note a chart and the bytes written for it in the in-memory manifest; it
+# reaches the disk with the next write_manifests
+def _record(directory, filename, key, data, hit):
+    manifest = _manifest(directory)
+    counts = _run_counts[directory]
+    counts['hits' if hit else 'misses'] += 1
+    manifest['charts'][filename] = {'key': key, 'sha256': hashlib.sha256(data).hexdigest(),
+                                    'status': 'hit' if hit else 'miss'}
+    manifest['last_run'] = dict(counts)
+    _changed.add(directory)
+
+
+# Write every manifest changed since the last call. Runs at exit and after each
+# render_buffers batch, so a run writes its manifest once instead of per chart.
+# A manifest lost to a crash only costs redrawing those charts next time.
+@atexit.register
+def write_manifests():
+    while _changed:
+        directory = _changed.pop()
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, MANIFEST_NAME), 'w') as f:
+            json.dump(_manifests[directory], f, indent=2, sort_keys=True)
+
+
+# PNG bytes of `filename` in `directory` when it was rendered from exactly this
+# key and is still the file written then, else None. The file's hash is checked
+# because plain show() calls (ClientMove.py, Ana.py, ...) write the same names.
+def current_chart(directory, filename, key):
+    entry = _manifest(directory)['charts'].get(filename)
+    path = os.path.join(directory, filename)
+    if entry is None or entry['key'] != key or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        data = f.read()
+    return data if hashlib.sha256(data).hexdigest() == entry.get('sha256') else None
+
+
+# Render func(*args, **kwargs) to `filename` unless an identical chart is already there.
+# Charts go to REPORT_OUTPUT_DIR in batch mode and to the working folder otherwise.
+# With display=True the figure is also shown when not in batch mode (which
+# means drawing it even on a cache hit). Returns the chart's path.
+@traced('render')
+def render_chart(filename, func, *args, display=False, **kwargs):
+    return _render_chart(filename, func, args, kwargs, display)[0]
+
+
+# render_chart without display, returning True when the chart was redrawn and
+# False when the file on disk was already current
+@traced('render')
+def refresh_chart(filename, func, *args, **kwargs):
+    return _render_chart(filename, func, args, kwargs, display=False)[1]
+
+
+# The chart's path and whether it had to be drawn
+def _render_chart(filename, func, args, kwargs, display):
+    directory = output_dir() or '.'
+    path = os.path.join(directory, filename)
+    key = chart_key(func, args, kwargs)
+    data = current_chart(directory, filename, key)
+    hit = data is not None
+    display = display and not batch_mode()
+
+    if hit and not display:
+        _record(directory, filename, key, data, hit=True)
+        return path, False
+
+    func(*args, **kwargs)
+    if not hit:
+        buffer = io.BytesIO()
+        plt.savefig(buffer, format='png', dpi=DPI)
+        data = buffer.getvalue()
+        os.makedirs(directory, exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+    _record(directory, filename, key, data, hit=hit)
+    if display:
+        plt.show()
+    else:
+        plt.close()
+    return path, not hit
+
+
+# Draw func(*args, **kwargs) on a new figure and return it as PNG bytes, never touching the disk
+@traced('render')
+def figure_bytes(func, args=(), kwargs=None):
+    func(*args, **(kwargs or {}))
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format='png', dpi=DPI)
+    plt.close()
+    return buffer.getvalue()
+
+
+def _buffer_job(job):
+    func, args = job
+    matplotlib.use('Agg', force=True)
+    return figure_bytes(func, args)
+
+
+# Render charts straight to in-memory PNGs, in a process pool.
+# `jobs` is a list of (filename, func, args). All renders are submitted right
+# away; the returned iterator yields the PNG bytes in job order as each one is
+# ready, so the caller can assemble slides while later figures still render.
+# In batch mode the chart cache is used as well: charts still current in
+# REPORT_OUTPUT_DIR (see current_chart) are read back instead of redrawn, and new renders
+# are written there. Outside batch mode nothing is written to disk.
+def render_buffers(jobs, workers=None):
+    directory = output_dir()
+    keys = [chart_key(func, args) for _, func, args in jobs] if directory else [None] * len(jobs)
+    cached = [current_chart(directory, filename, key) if directory else None
+              for (filename, _, _), key in zip(jobs, keys)]
+    pending = [(func, args) for (_, func, args), data in zip(jobs, cached) if data is None]
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    workers = worker_count(workers, pending) if pending else 1
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    rendered = pool.map(_buffer_job, pending) if pool else map(_buffer_job, pending)
+    return _stream_buffers(jobs, keys, cached, rendered, directory, pool)
+
+
+def _stream_buffers(jobs, keys, cached, rendered, directory, pool):
+    try:
+        for (filename, _, _), key, data in zip(jobs, keys, cached):
+            hit = data is not None
+            if not hit:
+                data = next(rendered)
+                if directory:
+                    with open(os.path.join(directory, filename), 'wb') as f:
+                        f.write(data)
+            if directory:
+                _record(directory, filename, key, data, hit=hit)
+            yield data
+    finally:
+        write_manifests()
+        if pool:
+            pool.shutdown(cancel_futures=True)
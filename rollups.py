@@ -0,0 +1,44 @@
+import pandas as pd
+
+from instrument import traced
+
+# Calendar resolutions derived from the daily rollup, labelled like pd.Grouper(freq=...):
+# weeks end on Sunday ('W'), months, quarters and years on their last day
+RESOLUTIONS = {
+    'day': pd.offsets.Day(),
+    'week': pd.offsets.Week(weekday=6),
+    'month': pd.offsets.MonthEnd(),
+    'quarter': pd.offsets.QuarterEnd(),
+    'year': pd.offsets.YearEnd(),
+}
+
+# Column of the daily rollup holding the number of raw rows per item and day
+ROWS_COLUMN = 'Rows'
+
+
+# Item x day totals of the raw rows, the only pass over them: one row per item
+# and day that had rows, with the summed value and the row count. The raw
+# column names are kept, so anything that groups the rows by item and date
+# (rollup_view, forecast.forecast_items) gives the same result on this table.
+@traced('aggregate', rows=len)
+def daily_rollup(df, date_column='Invoice Date', item_column='Item Name', value_column='Quantity'):
+    day = df[date_column].dt.floor('D')
+    grouped = df.groupby([df[item_column], day], observed=True)[value_column]
+    daily = grouped.sum().to_frame()
+    daily[ROWS_COLUMN] = grouped.size()
+    return daily.reset_index()
+
+
+# Item x period table of a daily rollup at one resolution ('week', 'month',
+# 'quarter', ...), the same table as grouping the raw rows by item and
+# pd.Grouper(key=date_column, freq=...)
+def rollup_view(daily, resolution, date_column='Invoice Date', item_column='Item Name', value_column='Quantity'):
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution {resolution!r}; use {list(RESOLUTIONS)}")
+    period = pd.Grouper(key=date_column, freq=RESOLUTIONS[resolution])
+    return daily.groupby([item_column, period], observed=True)[value_column].sum().unstack(fill_value=0)
+
+
+# Every resolution's item x period table from one daily rollup
+def rollup_views(daily, resolutions=tuple(RESOLUTIONS), **columns):
+    return {resolution: rollup_view(daily, resolution, **columns) for resolution in resolutions}
@@ -0,0 +1,109 @@
+import re
+
+import pandas as pd
+
+from dates import parse_date_column
+
+# Column kinds understood by apply_schema:
+#   'date'     -> datetime64 via dates.parse_date_column, unparseable values become NaT
+#   'category' -> pandas categorical (low-cardinality strings)
+#   'numeric'  -> smallest integer/float dtype that holds the values
+
+# Movement tracker columns, keyed by their stripped names
+TRACKER_SCHEMA = {
+    'Sending Date': 'date',
+    'Receiving Date': 'date',
+    'Warehouse': 'category',
+    'Clients': 'category',
+    'Type Of Movement': 'category',
+    'SR Statues': 'category',
+    "Qty's cases": 'numeric',
+}
+
+# '2024 invoices till July.csv' columns
+INVOICE_SCHEMA = {
+    'Invoice Date': 'date',
+    'Item Name': 'category',
+    'Quantity': 'numeric',
+}
+
+# Columns each report touches; None means the report needs every column
+REPORT_COLUMNS = {
+    'Ana': None,
+    'SentVsReceived': None,
+    'ClientMove': ['Clients', 'Type Of Movement'],
+    'Predc': ['Sending Date', 'Warehouse', 'Clients', 'Type Of Movement', "Qty's cases"],
+    'warehouseschart': ['Sending Date', 'Warehouse', 'Type Of Movement', 'SR Statues', "Qty's cases"],
+    'all': ['Sending Date', 'Clients', 'Type Of Movement', "Qty's cases"],
+    'Pre': ['Sending Date', 'Warehouse', 'Clients', 'Type Of Movement', 'SR Statues', "Qty's cases"],
+    'invoice': ['Invoice Date', 'Item Name', 'Quantity'],
+    'invoicepre': ['Invoice Date', 'Item Name', 'Quantity'],
+}
+
+
+# Columns of a report, or None when it reads everything
+def report_columns(report):
+    return REPORT_COLUMNS.get(report) if report else None
+
+
+# Convert a column to the smallest numeric dtype, turning junk into NaN
+def to_compact_numeric(series):
+    values = pd.to_numeric(series, errors='coerce')
+    if values.notna().all() and (values % 1 == 0).all():
+        return pd.to_numeric(values, downcast='integer')
+    return pd.to_numeric(values, downcast='float')
+
+
+def _column_key(name):
+    return ' '.join(str(name).split()).casefold()
+
+
+# Map a raw header name onto its schema name.
+# Handles the drift seen across yearly/per-site trackers: stray or doubled
+# whitespace ('SR Statues '), different capitalisation, and the '.1' suffix
+# read_csv adds to a repeated header. Unknown columns are only stripped.
+def canonical_name(raw, schema):
+    keys = {_column_key(name): name for name in schema}
+    key = _column_key(raw)
+    if key in keys:
+        return keys[key]
+    repeated = re.match(r'^(.*)\.\d+$', key)
+    if repeated and repeated.group(1) in keys:
+        return keys[repeated.group(1)]
+    return str(raw).strip()
+
+
+# Cast the columns of df that appear in schema to their declared kind.
+# `date_formats` memoizes the detected format per date column, so a file read
+# in chunks detects each format once and reuses it for later chunks.
+def apply_schema(df, schema, date_formats=None):
+    if date_formats is None:
+        date_formats = {}
+    for column, kind in schema.items():
+        if column not in df.columns:
+            continue
+        if kind == 'date':
+            df[column], report = parse_date_column(df, column, date_formats.get(column))
+            if report['format'] is not None:
+                date_formats.setdefault(column, report['format'])
+        elif kind == 'category':
+            if not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype('category')
+        elif kind == 'numeric':
+            df[column] = to_compact_numeric(df[column])
+    return df
+
+
+# dtype mapping for read_csv so categorical columns are parsed straight into categories.
+# Date columns are read as categories too: each distinct date string is then
+# kept once and parse_dates only has to convert the categories.
+def read_dtypes(header, schema):
+    return {raw: 'category' for raw in header if schema.get(canonical_name(raw, schema)) in ('category', 'date')}
+
+
+# Drop categories that no longer occur, e.g. after filtering rows by date
+def remove_unused_categories(df):
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].cat.remove_unused_categories()
+    return df
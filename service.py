@@ -0,0 +1,248 @@
+import os
+
+# Render off-screen; must be set before anything imports pyplot
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import itertools  # noqa: E402
+import json  # noqa: E402
+import threading  # noqa: E402
+from functools import lru_cache  # noqa: E402
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # noqa: E402
+from urllib.parse import parse_qs, urlsplit  # noqa: E402
+
+import pandas as pd  # noqa: E402
+
+from charts import plot_item_forecast  # noqa: E402
+from cube import DIMENSIONS, MEASURES, cube_metrics, load_cube  # noqa: E402
+from deck import DECK_METRICS, deck_charts  # noqa: E402
+from forecast import forecast_items  # noqa: E402
+from loader import INVOICE_CSV, TRACKER_CSV, load_invoices  # noqa: E402
+from render import figure_bytes  # noqa: E402
+from topk import top_clients, top_warehouses  # noqa: E402
+
+# Local only by default; pass another host on the command line to expose it
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8050
+
+# Responses (JSON and rendered charts) kept in the LRU cache
+CACHE_SIZE = 256
+
+# Most warehouses/clients a ranking returns
+MAX_TOP = 1000
+
+# Cube measures that count rows; the cube stores every measure as float64
+COUNT_MEASURES = ['rows']
+
+# pyplot keeps global state, so charts render one at a time
+_render_lock = threading.Lock()
+
+_generations = itertools.count()
+
+
+# A bad query: answered with 400 and the message
+class QueryError(ValueError):
+    pass
+
+
+# Nothing at that path or for that item: answered with 404. A separate class, so a
+# KeyError from a bug inside a view is answered with 500 rather than passed off as 404.
+class NotFound(LookupError):
+    pass
+
+
+# Everything the endpoints read, loaded once: the tracker cube and the item forecasts.
+# `generation` changes whenever the data is replaced, so cached responses of
+# older data are never served.
+class ReportData:
+    def __init__(self, tracker=TRACKER_CSV, invoices=INVOICE_CSV):
+        self.cube = load_cube(tracker)
+        self.forecasts = None
+        if invoices and os.path.exists(invoices):
+            df = load_invoices(invoices, report='invoice').dropna(subset=['Quantity'])
+            self.forecasts = forecast_items(df)
+        self.generation = next(_generations)
+
+
+_data = None
+
+
+def set_data(data):
+    global _data
+    _data = data
+
+
+# Month range of ?since=YYYY-MM&until=YYYY-MM (either may be left out), or None
+def _months(params):
+    bounds = []
+    for name in ['since', 'until']:
+        value = params.get(name)
+        try:
+            bounds.append(str(pd.Period(value, 'M')) if value else None)
+        except ValueError:
+            raise QueryError(f"'{name}' must be a month such as 2024-08, not {value!r}")
+    return slice(*bounds) if any(bounds) else None
+
+
+def _int(params, name, default):
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        raise QueryError(f"'{name}' must be an integer")
+    return max(1, min(value, MAX_TOP))
+
+
+def _series(series, label, value='count'):
+    return [{label: index, value: item} for index, item in series.items()]
+
+
+def _metrics(data, params, metrics):
+    return cube_metrics(data.cube, metrics, months=_months(params))
+
+
+def top_warehouses_view(data, params):
+    n = _int(params, 'n', 10)
+    counts = top_warehouses(_metrics(data, params, ['warehouse_counts']), n)
+    return _series(counts, 'warehouse')
+
+
+def status_counts_view(data, params):
+    return _series(_metrics(data, params, ['status_counts'])['status_counts'], 'status')
+
+
+def client_movements_view(data, params):
+    n = _int(params, 'n', 10)
+    table = top_clients(_metrics(data, params, ['client_movement']), n)
+    return [{'client': client, **row} for client, row in table.to_dict(orient='index').items()]
+
+
+def monthly_view(data, params):
+    movement = params.get('movement', 'Outbound')
+    if movement not in ('Outbound', 'Inbound'):
+        raise QueryError("'movement' must be Outbound or Inbound")
+    metric = f'monthly_{movement.lower()}'
+    counts = _metrics(data, params, [metric])[metric]
+    return [{'month': f'{date:%Y-%m}', 'count': count} for date, count in zip(counts['Sending Date'], counts['Count'])]
+
+
+def item_forecast_view(data, params):
+    if data.forecasts is None:
+        raise NotFound('No invoice data loaded')
+    forecasts = data.forecasts
+    if 'item' in params:
+        forecasts = forecasts[forecasts['Item Name'] == params['item']]
+        if forecasts.empty:
+            raise NotFound(f"Unknown item {params['item']!r}")
+    forecasts = forecasts.assign(**{'Invoice Date': forecasts['Invoice Date'].dt.strftime('%Y-%m-%d')})
+    forecasts = forecasts.astype(object).where(forecasts.notna(), None)
+    return forecasts.to_dict(orient='records')
+
+
+# Any cube query: ?by=Warehouse,Month&measure=cases&Warehouse=WH1&since=2024-01&until=2024-08
+def query_view(data, params):
+    by = [d for d in params.get('by', '').split(',') if d]
+    unknown = set(by) - set(DIMENSIONS)
+    if unknown:
+        raise QueryError(f"Unknown dimensions: {sorted(unknown)}; use {DIMENSIONS}")
+    measure = params.get('measure', 'rows')
+    if measure not in MEASURES:
+        raise QueryError(f"Unknown measure {measure!r}; use {MEASURES}")
+    where = {d: params[d].split('|') for d in DIMENSIONS if d in params and d != 'Month'}
+    if _months(params) is not None:
+        where['Month'] = _months(params)
+    result = data.cube.query(by, where, measure)
+    if measure in COUNT_MEASURES:
+        result = int(result) if not by else result.astype('int64')
+    if not by:
+        return {measure: result}
+    frame = result.reset_index()
+    if 'Month' in frame:
+        frame['Month'] = frame['Month'].dt.strftime('%Y-%m')
+    return frame.to_dict(orient='records')
+
+
+VIEWS = {
+    'top_warehouses': top_warehouses_view,
+    'status_counts': status_counts_view,
+    'client_movements': client_movements_view,
+    'monthly': monthly_view,
+    'item_forecast': item_forecast_view,
+    'query': query_view,
+}
+
+
+# PNG of a deck chart (see deck.deck_charts) or, for 'item_forecast', of one item's forecast
+def chart_png(data, name, params):
+    if name == 'item_forecast':
+        if data.forecasts is None or 'item' not in params:
+            raise NotFound("Item forecast charts need invoice data and an 'item'")
+        pred_data = data.forecasts[data.forecasts['Item Name'] == params['item']]
+        if pred_data.empty:
+            raise NotFound(f"Unknown item {params['item']!r}")
+        job = (plot_item_forecast, (params['item'], pred_data))
+    else:
+        charts = deck_charts(_metrics(data, params, DECK_METRICS))
+        if name not in charts:
+            raise NotFound(f"Unknown chart {name!r}; available: {sorted(charts) + ['item_forecast']}")
+        _, func, args = charts[name]
+        job = (func, args)
+    with _render_lock:
+        return figure_bytes(*job)
+
+
+# (status, content type, body) of one request, cached per data generation and query
+@lru_cache(maxsize=CACHE_SIZE)
+def respond(generation, path, query):
+    params = {key: values[-1] for key, values in parse_qs(query).items()}
+    parts = [part for part in path.split('/') if part]
+    try:
+        if parts[:1] == ['api'] and len(parts) == 2 and parts[1] in VIEWS:
+            body = json.dumps(VIEWS[parts[1]](_data, params), default=str)
+            return 200, 'application/json', body.encode()
+        if parts[:1] == ['charts'] and len(parts) == 2 and parts[1].endswith('.png'):
+            return 200, 'image/png', chart_png(_data, parts[1][:-len('.png')], params)
+        if not parts:
+            index = {'api': [f'/api/{name}' for name in VIEWS], 'charts': '/charts/<name>.png'}
+            return 200, 'application/json', json.dumps(index).encode()
+        raise NotFound(f'No such endpoint: {path}')
+    except QueryError as e:
+        return 400, 'application/json', json.dumps({'error': str(e)}).encode()
+    except NotFound as e:
+        return 404, 'application/json', json.dumps({'error': str(e)}).encode()
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            status, content_type, body = respond(_data.generation, url.path, url.query)
+        except Exception as e:
+            # Answer unexpected failures instead of dropping the connection (not cached, unlike 4xx)
+            self.log_error('Failed to answer %s: %r', self.path, e)
+            status, content_type, body = 500, 'application/json', json.dumps({'error': 'Internal error'}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# Load the data once and answer requests on threads until interrupted
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, tracker=TRACKER_CSV, invoices=INVOICE_CSV):
+    set_data(ReportData(tracker, invoices))
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Serving on http://{host}:{server.server_port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    import sys
+
+    # service.py [port] [host]
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    host = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_HOST
+    serve(host, port)
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+from aggregates import HIST_BINS, encode, month_codes
+
+# Mergeable distribution sketches.
+# A sketch is a plain count Series indexed by (group levels..., 'value'): every
+# value is replaced by the representative of its bucket and the buckets are
+# counted. Two sketches merge by adding the Series (chunked.merge_aggregates),
+# so they are kept per chunk, per file and in the incremental state like any
+# other count. Buckets grow geometrically (DDSketch-style), so quantiles read
+# from a sketch are within RELATIVE_ACCURACY of the true value and a sketch
+# stays a few hundred buckets per group however many rows go into it.
+
+# Relative error of a bucketed value
+RELATIVE_ACCURACY = 0.01
+
+# Whole numbers up to this size (case quantities, transit days) are counted
+# exactly, so their histograms and percentiles match the raw column
+EXACT_LIMIT = 1000
+
+QUANTILES = [0.5, 0.95, 0.99]
+
+# Dimensions a sketch is kept per; 'Total' is every row
+SKETCH_DIMENSIONS = ['Warehouse', 'Clients', 'Month']
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = np.log(_GAMMA)
+
+
+# Bucket representative of every value: exact for small whole numbers,
+# otherwise the midpoint of its geometric bucket (gamma^(k-1), gamma^k]
+def bucket_values(values):
+    values = np.asarray(values, dtype='float64')
+    magnitude = np.abs(values)
+    exact = (magnitude <= EXACT_LIMIT) & (values == np.round(values))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = np.ceil(np.log(magnitude) / _LOG_GAMMA)
+        bucketed = np.sign(values) * 2 * _GAMMA ** k / (_GAMMA + 1)
+    return np.where(exact | (magnitude == 0), values, bucketed)
+
+
+# Counts per bucket of a value Series, as a 'value'-indexed sketch
+def sketch(values):
+    values = pd.Series(values).dropna()
+    counts = pd.Series(bucket_values(values.to_numpy()), name='value').value_counts(sort=False)
+    return counts.sort_index().rename('count')
+
+
+# Integer codes and labels of one dimension; missing values get code -1.
+# 'Month' is the Sending Date month, labelled YYYY-MM.
+def _encode_dimension(frame, dimension):
+    if dimension == 'Total':
+        return np.zeros(len(frame), dtype='int64'), pd.Index(['All'])
+    if dimension != 'Month':
+        codes, labels = encode(frame[dimension])
+        return codes, pd.Index(labels.astype(str))
+    months, valid = month_codes(frame['Sending Date'])
+    uniques = np.unique(months[valid])
+    codes = np.where(valid, np.searchsorted(uniques, months), -1)
+    return codes, pd.Index(uniques.astype('datetime64[M]').astype(str))
+
+
+# Sketch of `values` per (by..., Dimension, Series): one group for the total
+# and one per warehouse, client and month of the rows in `frame` (dimensions
+# whose column the frame doesn't have are skipped).
+# Every group and bucket is folded into one integer code and counted with np.unique.
+def grouped_sketch(frame, values, by=(), dimensions=SKETCH_DIMENSIONS):
+    by = list(by)
+    keep = values.notna().to_numpy()
+    frame = frame[keep]
+    buckets, bucket_codes = np.unique(bucket_values(values.to_numpy()[keep]), return_inverse=True)
+    by_encoded = [encode(frame[column]) for column in by]
+
+    columns = {'Total': None, 'Month': 'Sending Date'}
+    dimensions = [d for d in ['Total'] + list(dimensions) if columns.get(d, d) in [None, *frame.columns]]
+    parts = []
+    for dimension in dimensions:
+        encoded = by_encoded + [_encode_dimension(frame, dimension)]
+        shape = [len(labels) for _, labels in encoded] + [len(buckets)]
+        valid = np.logical_and.reduce([codes >= 0 for codes, _ in encoded])
+        key = np.ravel_multi_index([codes[valid] for codes, _ in encoded] + [bucket_codes[valid]], shape)
+        keys, counts = np.unique(key, return_counts=True)
+        positions = np.unravel_index(keys, shape)
+        arrays = [np.asarray(labels, dtype=object)[p] for (_, labels), p in zip(encoded, positions)]
+        index = pd.MultiIndex.from_arrays(arrays + [buckets[positions[-1]]], names=by + ['Series', 'value'])
+        parts.append(pd.concat({dimension: pd.Series(counts, index=index)}, names=['Dimension']))
+    result = pd.concat(parts)
+    if by:
+        result = result.reorder_levels(by + ['Dimension', 'Series', 'value'])
+    return result.rename('count')
+
+
+# Case-quantity sketch of a chunk per movement type, total, warehouse, client and month
+def quantity_sketch(chunk):
+    return grouped_sketch(chunk, chunk["Qty's cases"], by=['Type Of Movement'])
+
+
+# Transit-time sketch (days) of the received rows of a chunk. A received row
+# carries the sending date it was matched on (reconcile.MATCH_KEYS), so its own
+# two dates give the same transit time as the reconciled pair.
+def transit_sketch(chunk):
+    received = chunk[chunk['SR Statues'] == 'Received']
+    transit = (received['Receiving Date'] - received['Sending Date']) / np.timedelta64(1, 'D')
+    return grouped_sketch(received, transit)
+
+
+# Quantiles of every group of a sketch, with the number of values per group.
+# Reads the first bucket whose cumulative count reaches q of the group's total.
+def sketch_quantiles(counts, quantiles=QUANTILES):
+    groups = [name for name in counts.index.names if name != 'value']
+    if not groups:
+        counts = pd.concat({'All': counts}, names=['Series'])
+        groups = ['Series']
+    counts = counts[counts > 0].sort_index()
+    cumulative = counts.groupby(level=groups, sort=False).cumsum()
+    totals = counts.groupby(level=groups, sort=False).transform('sum')
+    values = pd.Series(counts.index.get_level_values('value'), index=counts.index)
+
+    summary = counts.groupby(level=groups).sum().rename('count').to_frame()
+    for q in quantiles:
+        reached = values[cumulative >= q * totals]
+        summary[f'p{q * 100:g}'] = reached.groupby(level=groups).first()
+    return summary.sort_values('count', ascending=False, kind='stable')
+
+
+# (counts, edges) histogram of one group's sketch, like np.histogram of the raw values
+def sketch_histogram(counts, bins=HIST_BINS):
+    counts = counts[counts > 0]
+    if not len(counts):
+        return None
+    values = counts.index.get_level_values('value').to_numpy(dtype='float64')
+    hist, edges = np.histogram(values, bins=bins, weights=counts.to_numpy())
+    return hist.astype('int64'), edges
+
+
+# One group of a grouped sketch, e.g. select(counts, Dimension='Warehouse', Series='WH1')
+def select(counts, **levels):
+    if not levels:
+        return counts
+    return counts.xs(tuple(levels.values()), level=list(levels), drop_level=True)
@@ -0,0 +1,218 @@
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from aggregates import compute_metrics
+from chunked import metric_columns
+from instrument import traced
+from loader import CACHE_DIR, SOURCE_COLUMN, TRACKER_CSV, cache_name, concat_frames, expand_paths, file_hash, \
+    is_glob, load_tracker
+from schema import TRACKER_SCHEMA
+
+# Bump when the table layout changes so older stores are rebuilt
+STORE_VERSION = 1
+
+TABLE = 'movements'
+
+# Columns with an index; lookups filtering on them never scan the table
+INDEXED = ['Clients', 'Warehouse', 'Sending Date', 'SR Statues']
+
+# Filters accepted by lookup(), as keyword -> column
+FILTERS = {
+    'clients': 'Clients',
+    'warehouses': 'Warehouse',
+    'statuses': 'SR Statues',
+    'movements': 'Type Of Movement',
+}
+
+# Streamed aggregate (see chunked.METRIC_COLUMNS) that reads the same columns as each in-memory metric
+METRIC_SOURCES = {
+    'monthly_outbound': 'monthly_movement',
+    'monthly_inbound': 'monthly_movement',
+    'outbound_qty_hist': 'outbound_quantities',
+}
+
+
+def _store_path(path, cache_dir):
+    return os.path.join(cache_dir, cache_name(path) + '.sqlite')
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+# Dates are stored as ISO text ('2024-08-31T00:00:00'), which sorts like the dates
+def _date_text(value):
+    return np.datetime_as_string(np.datetime64(pd.Timestamp(value), 's'), unit='s')
+
+
+def _sql_column(series):
+    if series.dtype.kind == 'M':
+        text = np.datetime_as_string(series.to_numpy().astype('datetime64[s]'), unit='s').astype(object)
+        text[series.isna().to_numpy()] = None
+        return text
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.astype(object).where(series.notna(), None).to_numpy()
+    return series.to_numpy()
+
+
+# The store's metadata, or None when it is missing or from another layout
+def _read_meta(con):
+    try:
+        meta = json.loads(con.execute('SELECT value FROM meta').fetchone()[0])
+    except (sqlite3.Error, TypeError):
+        return None
+    return meta if meta.get('version') == STORE_VERSION else None
+
+
+# Write every row of a tracker file into a new SQLite file, with the row's
+# position in the file as its key and an index per INDEXED column. The column
+# dtypes and categories are kept so lookups return the frames load_tracker builds.
+@traced('export')
+def build_store(df, path, store_path):
+    stat = os.stat(path)
+    meta = {
+        'version': STORE_VERSION,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': file_hash(path),
+        'columns': list(df.columns),
+        'dtypes': {c: str(df[c].dtype) for c in df.columns if not isinstance(df[c].dtype, pd.CategoricalDtype)},
+        'categories': {c: df[c].cat.categories.tolist() for c in df.columns
+                       if isinstance(df[c].dtype, pd.CategoricalDtype)},
+    }
+    os.makedirs(os.path.dirname(store_path) or '.', exist_ok=True)
+    tmp_path = store_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    con = sqlite3.connect(tmp_path)
+    try:
+        columns = ', '.join(_quote(c) for c in df.columns)
+        con.execute(f'CREATE TABLE {TABLE} ("row" INTEGER PRIMARY KEY, {columns})')
+        values = [df.index.to_numpy()] + [_sql_column(df[c]) for c in df.columns]
+        placeholders = ', '.join('?' * len(values))
+        con.executemany(f'INSERT INTO {TABLE} VALUES ({placeholders})', zip(*(v.tolist() for v in values)))
+        for column in INDEXED:
+            if column in df.columns:
+                con.execute(f'CREATE INDEX {_quote("by " + column)} ON {TABLE} ({_quote(column)})')
+        con.execute('CREATE TABLE meta (value TEXT)')
+        con.execute('INSERT INTO meta VALUES (?)', (json.dumps(meta),))
+        con.commit()
+    finally:
+        con.close()
+    os.replace(tmp_path, store_path)
+    return meta
+
+
+# Connection to the store of one tracker file, (re)built when the file changed:
+# size and mtime are checked first, then the content hash
+def open_store(path=TRACKER_CSV, cache_dir=CACHE_DIR):
+    store_path = _store_path(path, cache_dir)
+    if os.path.exists(store_path):
+        con = sqlite3.connect(store_path, check_same_thread=False)
+        meta = _read_meta(con)
+        stat = os.stat(path)
+        if meta is not None and meta['size'] == stat.st_size and (
+                meta['mtime_ns'] == stat.st_mtime_ns or meta['sha256'] == file_hash(path)):
+            return con, meta
+        con.close()
+    meta = build_store(load_tracker(path, cache_dir=cache_dir), path, store_path)
+    return sqlite3.connect(store_path, check_same_thread=False), meta
+
+
+def _values(value):
+    return [value] if isinstance(value, str) else list(value)
+
+
+# WHERE clause and parameters for the given filters
+def _where(filters, date_from, date_until):
+    clauses, params = [], []
+    for keyword, column in FILTERS.items():
+        if filters.get(keyword) is not None:
+            values = _values(filters[keyword])
+            clauses.append(f"{_quote(column)} IN ({', '.join('?' * len(values))})")
+            params += values
+    if date_from is not None:
+        clauses.append(f'{_quote("Sending Date")} >= ?')
+        params.append(_date_text(date_from))
+    if date_until is not None:
+        clauses.append(f'{_quote("Sending Date")} <= ?')
+        params.append(_date_text(date_until))
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+
+# Cast the columns read back from SQLite to the dtypes the tracker was loaded with
+def _restore_types(df, meta):
+    for column in df.columns:
+        if column in meta['categories']:
+            df[column] = pd.Categorical(df[column], categories=meta['categories'][column])
+        elif TRACKER_SCHEMA.get(column) == 'date':
+            df[column] = pd.to_datetime(df[column], format='ISO8601').astype(meta['dtypes'][column])
+        else:
+            df[column] = df[column].astype(meta['dtypes'][column])
+    return df
+
+
+def _lookup_file(path, columns, date_from, date_until, cache_dir, filters):
+    con, meta = open_store(path, cache_dir)
+    try:
+        wanted = [c for c in meta['columns'] if columns is None or c in columns]
+        where, params = _where(filters, date_from, date_until)
+        selected = ', '.join(['"row"'] + [_quote(c) for c in wanted])
+        df = pd.read_sql_query(f'SELECT {selected} FROM {TABLE}{where} ORDER BY "row"', con, params=params,
+                               index_col='row')
+    finally:
+        con.close()
+    df.index.name = None
+    return _restore_types(df, meta)
+
+
+# Tracker rows matching every given filter, read through the indexes instead of
+# scanning the file. Filters are `clients`, `warehouses`, `statuses` and
+# `movements` (a name or a list of names) and an inclusive Sending Date range.
+# The frame is typed like load_tracker's and in file order, indexed by row number,
+# so it equals the same rows selected from load_tracker(path).
+@traced('load', rows=len)
+def lookup(path=TRACKER_CSV, columns=None, date_from=None, date_until=None, cache_dir=CACHE_DIR, **filters):
+    unknown = set(filters) - set(FILTERS)
+    if unknown:
+        raise TypeError(f"Unknown filters {sorted(unknown)}; use {sorted(FILTERS)}")
+    paths = expand_paths(path)
+    frames = [_lookup_file(p, columns, date_from, date_until, cache_dir, filters) for p in paths]
+    if not is_glob(path):
+        return frames[0]
+    for file_path, frame in zip(paths, frames):
+        frame[SOURCE_COLUMN] = pd.Categorical([file_path] * len(frame), categories=[file_path])
+    return concat_frames(frames)
+
+
+# The reports' metrics (see aggregates.METRICS) over just the rows a lookup selects,
+# e.g. lookup_metrics(['client_movement', 'monthly_outbound'], clients='ACME')
+def lookup_metrics(metrics, path=TRACKER_CSV, date_from=None, date_until=None, cache_dir=CACHE_DIR, **filters):
+    columns = metric_columns([METRIC_SOURCES.get(m, m) for m in metrics if m != 'row_count'])
+    df = lookup(path, columns=columns, date_from=date_from, date_until=date_until,
+                cache_dir=cache_dir, **filters)
+    return compute_metrics(df, metrics)
+
+
+if __name__ == '__main__':
+    import sys
+
+    # store.py [clients=NAME] [warehouses=WH1|WH2] [statuses=...] [movements=...] [since=DATE] [until=DATE]
+    args = dict(arg.split('=', 1) for arg in sys.argv[1:])
+    since, until = args.pop('since', None), args.pop('until', None)
+    filters = {key: value.split('|') for key, value in args.items()}
+    rows = lookup(date_from=since, date_until=until, **filters)
+    print(f"{len(rows):,} rows")
+    print(rows.head(20))
+    if len(rows):
+        metrics = compute_metrics(rows, ['client_movement', 'monthly_outbound', 'monthly_inbound'])
+        print("\nMovements by client:")
+        print(metrics['client_movement'])
+        print("\nOutbound by month:")
+        print(metrics['monthly_outbound'])
+        print("\nInbound by month:")
+        print(metrics['monthly_inbound'])
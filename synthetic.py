@@ -0,0 +1,126 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Rows generated and written per chunk, so 50M-row files never sit in memory at once
+CHUNK_ROWS = 1_000_000
+
+# Date format of the real exports
+DATE_FORMAT = '%m/%d/%Y'
+
+MOVEMENTS = ['Inbound', 'Outbound']
+STATUSES = ['Sent', 'Received', 'Pending', 'Cancelled']
+STATUS_WEIGHTS = [0.35, 0.45, 0.15, 0.05]
+
+
+# Zipf-like weights: a few clients/items/warehouses carry most of the volume, as in the real data
+def _skewed_weights(n, exponent=1.1):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+# One independent random generator per chunk, so any chunk can be regenerated on its own
+def _chunk_rngs(seed, n_chunks):
+    return [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(n_chunks)]
+
+
+def _chunk_sizes(rows, chunk_rows):
+    return [min(chunk_rows, rows - start) for start in range(0, rows, chunk_rows)]
+
+
+# Each day's date string once, so formatting costs nothing per row
+def _day_strings(start, days):
+    return np.array(pd.date_range(start, periods=days, freq='D').strftime(DATE_FORMAT), dtype=object)
+
+
+def _tracker_chunk(rng, n, start, days, warehouses, clients, missing):
+    day_strings = _day_strings(start, days + 30)
+    sending = rng.integers(0, days, n)
+    transit = rng.integers(0, 14, n)
+    status = rng.choice(len(STATUSES), n, p=STATUS_WEIGHTS)
+
+    receiving = day_strings[sending + transit]
+    receiving[status != STATUSES.index('Received')] = ''
+
+    frame = pd.DataFrame({
+        'Sending Date': day_strings[sending],
+        'Receiving Date': receiving,
+        'Warehouse': np.array([f'WH{i + 1}' for i in range(warehouses)], dtype=object)[
+            rng.choice(warehouses, n, p=_skewed_weights(warehouses, 0.6))],
+        'Clients': np.array([f'Client {i + 1}' for i in range(clients)], dtype=object)[
+            rng.choice(clients, n, p=_skewed_weights(clients))],
+        'Type Of Movement': np.array(MOVEMENTS, dtype=object)[rng.integers(0, len(MOVEMENTS), n)],
+        # Trailing space as in the real export's header
+        'SR Statues ': np.array(STATUSES, dtype=object)[status],
+        "Qty's cases": pd.array(rng.geometric(1 / 25, n), dtype='Int64'),
+    })
+    # Blank out a share of dates and quantities like the hand-kept tracker has
+    if missing:
+        frame.loc[rng.random(n) < missing, "Qty's cases"] = pd.NA
+        frame.loc[rng.random(n) < missing / 5, 'Sending Date'] = ''
+    return frame
+
+
+def _invoice_chunk(rng, n, start, days, items):
+    day_strings = _day_strings(start, days)
+    return pd.DataFrame({
+        'Invoice Date': day_strings[rng.integers(0, days, n)],
+        'Item Name': np.array([f'Item {i + 1}' for i in range(items)], dtype=object)[
+            rng.choice(items, n, p=_skewed_weights(items))],
+        'Quantity': rng.geometric(1 / 10, n),
+    })
+
+
+# Movement tracker rows with the real columns, reproducible from `seed`.
+# Yields DataFrames of up to `chunk_rows` rows.
+def iter_tracker(rows, seed=0, start='2024-01-01', days=366, warehouses=15, clients=200, missing=0.01,
+                 chunk_rows=CHUNK_ROWS):
+    sizes = _chunk_sizes(rows, chunk_rows)
+    for rng, n in zip(_chunk_rngs(seed, len(sizes)), sizes):
+        yield _tracker_chunk(rng, n, start, days, warehouses, clients, missing)
+
+
+# Invoice rows with the real columns, reproducible from `seed`
+def iter_invoices(rows, seed=0, start='2024-01-01', days=213, items=500, chunk_rows=CHUNK_ROWS):
+    sizes = _chunk_sizes(rows, chunk_rows)
+    for rng, n in zip(_chunk_rngs(seed, len(sizes)), sizes):
+        yield _invoice_chunk(rng, n, start, days, items)
+
+
+def generate_tracker(rows, seed=0, **kwargs):
+    return pd.concat(iter_tracker(rows, seed, **kwargs), ignore_index=True)
+
+
+def generate_invoices(rows, seed=0, **kwargs):
+    return pd.concat(iter_invoices(rows, seed, **kwargs), ignore_index=True)
+
+
+# Stream generated chunks into one CSV
+def _write_chunks(chunks, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', newline='') as f:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(f, index=False, header=i == 0)
+    return path
+
+
+def write_tracker(path, rows, seed=0, **kwargs):
+    return _write_chunks(iter_tracker(rows, seed, **kwargs), path)
+
+
+def write_invoices(path, rows, seed=0, **kwargs):
+    return _write_chunks(iter_invoices(rows, seed, **kwargs), path)
+
+
+if __name__ == '__main__':
+    import sys
+
+    kind = sys.argv[1] if len(sys.argv) > 1 else 'tracker'
+    rows = int(float(sys.argv[2])) if len(sys.argv) > 2 else 10_000
+    path = sys.argv[3] if len(sys.argv) > 3 else f'synthetic_{kind}_{rows}.csv'
+    seed = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+    writers = {'tracker': write_tracker, 'invoices': write_invoices}
+    if kind not in writers:
+        raise SystemExit(f"usage: synthetic.py [{'|'.join(writers)}] [rows] [path] [seed]")
+    print(writers[kind](path, rows, seed))
@@ -0,0 +1,66 @@
+import pandas as pd
+
+from cube import build_cube
+from loader import load_tracker
+from watch import InvoiceWatch, TrackerWatch
+
+HEADER = "Sending Date,Receiving Date,Warehouse,Clients,Type Of Movement,SR Statues,Qty's cases"
+
+
+def _row(day, client='A', movement='Outbound', quantity=5):
+    return f"{day},{day},WH1,{client},{movement},Sent,{quantity}"
+
+
+def _write(path, rows):
+    path.write_text('\n'.join([HEADER, *rows]) + '\n')
+
+
+def _months(cube):
+    counts = cube.query(['Month'])
+    return {f'{month:%Y-%m}': int(count) for month, count in counts.items() if count}
+
+
+# Rows appended to or edited in a day-first tracker are counted in the month
+# the whole file's format says, even when the changed rows alone are ambiguous
+def test_day_first_changes_match_a_rebuild(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / 'tracker.csv'
+    # 25/03 and 28/04 only parse day-first, so the file's format is '%d/%m/%Y'
+    rows = [_row('25/03/2024'), _row('05/03/2024'), _row('28/04/2024', movement='Inbound'), _row('02/05/2024')]
+    _write(path, rows)
+    watcher = TrackerWatch(str(path))
+    assert watcher.date_formats['Sending Date'] == '%d/%m/%Y'
+
+    # Append a 5 March row and edit the existing 5 March row into 4 May
+    rows = [rows[0], _row('04/05/2024'), rows[2], rows[3], _row('05/03/2024', client='B')]
+    _write(path, rows)
+    change = watcher.update()
+
+    assert change['changed'] == ['2024-03', '2024-05']
+    expected = build_cube(load_tracker(str(path), use_cache=False))
+    assert _months(watcher.cube) == _months(expected) == {'2024-03': 2, '2024-04': 1, '2024-05': 2}
+    assert watcher.cube.query() == len(rows)
+    assert pd.Series(watcher.cube.measures['rows']).ge(0).all()
+
+
+# A blank line leaves the frame and the snapshot in step, so an edit after it
+# still recomputes the edited item, and a quoted field spanning lines reloads the file
+def test_invoice_lines_stay_aligned_with_rows(tmp_path):
+    path = tmp_path / 'invoices.csv'
+    rows = [f"0{month}/01/2024,Item {month % 2},{month}" for month in range(1, 10)]
+    path.write_text('\n'.join(['Invoice Date,Item Name,Quantity', *rows]) + '\n')
+    watcher = InvoiceWatch(str(path))
+
+    path.write_text('\n'.join(['Invoice Date,Item Name,Quantity', *rows[:3], '', *rows[3:]]) + '\n')
+    assert watcher.update() == {'removed': 0, 'added': 0, 'changed': []}
+    rows[6] = '07/01/2024,Item 1,70'
+    path.write_text('\n'.join(['Invoice Date,Item Name,Quantity', *rows[:3], '', *rows[3:]]) + '\n')
+    assert watcher.update()['changed'] == ['Item 1']
+    assert len(watcher.df) == len(watcher.snapshot['rows']) == 9
+    assert watcher.df['Quantity'].sum() == sum(range(1, 10)) - 7 + 70
+
+    rows.append('09/02/2024,"Item\n 2",5')
+    path.write_text('\n'.join(['Invoice Date,Item Name,Quantity', *rows]) + '\n')
+    watcher.update()
+    assert len(watcher.df) == 10
+    assert watcher.df['Item Name'].iloc[-1] == 'Item\n 2'
@@ -0,0 +1,128 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from aggregates import encode
+
+# Items a summary monitors. Every count is off by at most (rows / capacity), and any
+# item with more rows than that is guaranteed to be monitored.
+DEFAULT_CAPACITY = 1000
+
+# Set TRACKER_TOPK to the capacity of the streamed top-N summaries; 0 keeps every item (exact)
+CAPACITY_ENV = 'TRACKER_TOPK'
+
+MOVEMENTS = ['Inbound', 'Outbound']
+
+
+# Capacity requested through the environment; None means exact (no pruning)
+def topk_capacity():
+    value = os.environ.get(CAPACITY_ENV)
+    if not value:
+        return DEFAULT_CAPACITY
+    return int(value) or None
+
+
+# Space-Saving heavy-hitter summary in bounded memory, mergeable across chunks and files.
+# `table` holds the monitored items with their estimated count (never below the
+# true count), the possible overestimate `error`, and optional per-`breakdown`
+# counts (e.g. Inbound/Outbound) seen while the item was monitored. `floor` is the
+# most rows any unmonitored item can have. While no more than `capacity` distinct
+# items have been seen nothing is pruned and the summary is exact.
+class SpaceSaving:
+    __slots__ = ('capacity', 'table', 'floor', 'rows')
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, breakdown=()):
+        self.capacity = capacity
+        self.table = pd.DataFrame({name: pd.Series(dtype='int64') for name in ['count', 'error', *breakdown]})
+        self.floor = 0
+        self.rows = 0
+
+    # Add a batch of items (a Series), with `by` giving each row's breakdown column
+    def update(self, items, by=None):
+        codes, labels = encode(items)
+        breakdown = list(self.table.columns[2:])
+        valid = codes >= 0
+        if breakdown:
+            by_codes = pd.Categorical(by, categories=breakdown).codes
+            valid &= by_codes >= 0
+            keys = codes[valid] * len(breakdown) + by_codes[valid]
+            counts = np.bincount(keys, minlength=len(labels) * len(breakdown)).reshape(len(labels), len(breakdown))
+        else:
+            counts = np.zeros((len(labels), 0), dtype='int64')
+        totals = np.bincount(codes[valid], minlength=len(labels))
+        seen = totals > 0
+
+        batch = SpaceSaving(None, breakdown)
+        batch.table = pd.DataFrame(counts[seen], index=pd.Index(np.asarray(labels, dtype=object)[seen]),
+                                   columns=breakdown)
+        batch.table.insert(0, 'count', totals[seen])
+        batch.table.insert(1, 'error', 0)
+        batch.rows = int(valid.sum())
+        return self.merge(batch)
+
+    # Fold another summary into this one. Items missing from one side are counted
+    # at that side's floor (their most possible rows), which also goes into the error.
+    def merge(self, other):
+        if other is None:
+            return self
+        index = self.table.index.union(other.table.index)
+        mine, theirs = self.table.reindex(index), other.table.reindex(index)
+        table = mine.fillna(0) + theirs.fillna(0)
+        for name in ['count', 'error']:
+            table[name] = mine[name].fillna(self.floor) + theirs[name].fillna(other.floor)
+        self.table = table.astype('int64')
+        self.floor += other.floor
+        self.rows += other.rows
+        self._prune()
+        return self
+
+    # Keep the `capacity` largest items; the largest dropped count raises the floor
+    def _prune(self):
+        if self.capacity is None or len(self.table) <= self.capacity:
+            return
+        order = np.argsort(-self.table['count'].to_numpy(), kind='stable')
+        dropped = self.table['count'].to_numpy()[order[self.capacity:]]
+        self.floor = max(self.floor, int(dropped.max()))
+        self.table = self.table.iloc[np.sort(order[:self.capacity])]
+
+    # True when every count is exact (nothing was ever pruned)
+    def exact(self):
+        return self.floor == 0
+
+    # The n items with the largest counts, with each count's lower bound and
+    # whether the item is certainly in the top n: its lower bound is at least
+    # the largest count any item outside the top n can have.
+    def top(self, n):
+        table = self.table.sort_values('count', ascending=False, kind='stable')
+        outside = max(self.floor, int(table['count'].iloc[n]) if len(table) > n else 0)
+        top = table.head(n).copy()
+        top['lower'] = top['count'] - top['error']
+        top['guaranteed'] = top['lower'] >= outside
+        return top
+
+
+# Top-n clients as a Clients x Type Of Movement table, from a 'client_topk'
+# summary when the metrics have one, otherwise from the full 'client_movement' table
+def top_clients(metrics, n):
+    if 'client_topk' in metrics:
+        top = metrics['client_topk'].top(n)
+        return top[MOVEMENTS].rename_axis('Clients').rename_axis('Type Of Movement', axis=1)
+    movement_counts = metrics['client_movement']
+    return movement_counts.loc[movement_counts.sum(axis=1).nlargest(n).index]
+
+
+# Top-n warehouses by order count, from a 'warehouse_topk' summary or the full 'warehouse_counts'
+def top_warehouses(metrics, n):
+    if 'warehouse_topk' in metrics:
+        return metrics['warehouse_topk'].top(n)['count'].rename_axis('Warehouse')
+    return metrics['warehouse_counts'].nlargest(n)
+
+
+# One line on how far a streamed top-n ranking can be trusted
+def describe_top(summary, n):
+    if summary.exact():
+        return f"Top {n}: exact ({len(summary.table):,} items, {summary.rows:,} rows)"
+    top = summary.top(n)
+    return (f"Top {n}: approximate, counts within +{summary.floor:,} of {summary.rows:,} rows; "
+            f"{int(top['guaranteed'].sum())} of {len(top)} certainly in the top {n}")
@@ -1,30 +1,61 @@
 import pandas as pd
 import matplotlib.pyplot as plt
+from charts import plot_quantity_histogram
+from chunked import aggregate_tracker_chunked, streaming_chunksize
+from loader import load_tracker
+from render import show
+from sketches import quantity_sketch, select, sketch_histogram, sketch_quantiles
+from topk import top_warehouses
 
-# Load the CSV file without parsing dates first
-df = pd.read_csv('Master Tracker 2024 krk(Movement).csv')
 
-# Normalize column names by stripping whitespace
-df.columns = df.columns.str.strip()
+# Group movements by 'Sending Date' month
+def monthly_counts(movements):
+    counts = movements.groupby(movements['Sending Date'].dt.to_period('M')).size()
+    counts = counts.reset_index(name='Count')
+    counts['Sending Date'] = counts['Sending Date'].dt.to_timestamp()
+    return counts
+
+
+# Stream the tracker in chunks when TRACKER_CHUNKSIZE is set, otherwise load it whole
+chunksize = streaming_chunksize()
+df = None if chunksize else load_tracker(report='warehouseschart')
 
 # Check if 'Sending Date' is in the DataFrame
-if 'Sending Date' not in df.columns:
+if df is not None and 'Sending Date' not in df.columns:
     print("'Sending Date' column not found. Available columns are:")
     print(df.columns)
 else:
-    # Parse 'Sending Date'
-    df['Sending Date'] = pd.to_datetime(df['Sending Date'], errors='coerce')
-
-    # Check for missing values
-    print("\nMissing Values:")
-    print(df.isnull().sum())
-
-    # Filter records for outbound and inbound movements
-    outbound_movements = df[df['Type Of Movement'] == 'Outbound']
-    inbound_movements = df[df['Type Of Movement'] == 'Inbound']
-
-    # Count of orders by Warehouse (Top N)
-    warehouse_counts = df['Warehouse'].value_counts()
+    if df is not None:
+        # Check for missing values
+        print("\nMissing Values:")
+        print(df.isnull().sum())
+
+        # Filter records for outbound and inbound movements
+        outbound_movements = df[df['Type Of Movement'] == 'Outbound']
+        inbound_movements = df[df['Type Of Movement'] == 'Inbound']
+        outbound_counts = monthly_counts(outbound_movements)
+        inbound_counts = monthly_counts(inbound_movements)
+
+        # Count of orders by Warehouse and by status
+        warehouse_counts = df['Warehouse'].value_counts()
+        status_counts = df['SR Statues'].value_counts() if 'SR Statues' in df.columns else None
+        quantities = quantity_sketch(df)
+    else:
+        # Streaming mode: only merged counts, a bounded top-warehouse summary and quantity sketches are kept in memory
+        metrics = ['status_counts', 'monthly_movement', 'warehouse_topk', 'quantity_sketch']
+        aggregates = aggregate_tracker_chunked(chunksize=chunksize, metrics=metrics)
+        outbound_movements = inbound_movements = None
+        outbound_counts = aggregates['monthly_outbound']
+        inbound_counts = aggregates['monthly_inbound']
+        warehouse_counts = top_warehouses(aggregates, 10)
+        status_counts = aggregates['status_counts']
+        quantities = aggregates['quantity_sketch']
+
+    # Quantity percentiles per movement type and warehouse, from the quantity sketch
+    print("\nQuantity Percentiles by Warehouse:")
+    print(sketch_quantiles(select(quantities, Dimension='Warehouse')))
+
+    # Top N warehouses by order count
     top_n_warehouses = warehouse_counts.nlargest(10)
 
     # Plotting the count of orders by Warehouse (Top N)
@@ -35,7 +66,7 @@ else:
     plt.ylabel('Count')
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.show()
+    show('top_warehouses_bar_chart')
 
     # Pie Chart for orders by Warehouse (Top N)
     plt.figure(figsize=(8, 8))
@@ -43,11 +74,10 @@ else:
     plt.title('Distribution of Orders by Top 10 Warehouses')
     plt.ylabel('')  # Hide the y-label
     plt.tight_layout()
-    plt.show()
+    show('warehouse_distribution_pie_chart')
 
     # Plotting the count of orders by status if available
-    if 'SR Statues' in df.columns:
-        status_counts = df['SR Statues'].value_counts()
+    if status_counts is not None:
         plt.figure(figsize=(10, 6))
         status_counts.plot(kind='bar', color='skyblue')
         plt.title('Count of Orders by Status')
@@ -55,15 +85,10 @@ else:
         plt.ylabel('Count')
         plt.xticks(rotation=45)
         plt.tight_layout()
-        plt.show()
+        show('orders_by_status_bar_chart')
 
     # Function to plot outbound movements
-    def plot_outbound(outbound_movements):
-        # Grouping outbound movements by 'Sending Date'
-        outbound_counts = outbound_movements.groupby(outbound_movements['Sending Date'].dt.to_period('M')).size()
-        outbound_counts = outbound_counts.reset_index(name='Count')
-        outbound_counts['Sending Date'] = outbound_counts['Sending Date'].dt.to_timestamp()
-
+    def plot_outbound(outbound_counts, outbound_movements=None):
         # Plot historical data
         plt.figure(figsize=(8, 4))
         plt.plot(outbound_counts['Sending Date'], outbound_counts['Count'], marker='o', color='orange', label='Historical Data')
@@ -97,10 +122,19 @@ else:
         plt.xlim(pd.Timestamp('2024-01-01'), future_predictions['Sending Date'].max())
         plt.tight_layout()
         plt.legend()
-        plt.show()
-
-        # Convert 'Qty's cases' to numeric and drop NaN values
-        outbound_movements['Qty\'s cases'] = pd.to_numeric(outbound_movements['Qty\'s cases'], errors='coerce')
+        show('outbound_movements_forecast')
+
+        # Streaming mode keeps no raw rows: the histogram comes from the quantity sketch
+        if outbound_movements is None:
+            hist = sketch_histogram(select(quantities, **{'Type Of Movement': 'Outbound', 'Dimension': 'Total'}))
+            if hist is None:
+                print("Column 'Qty's cases' contains no data in outbound movements.")
+                return
+            plot_quantity_histogram(hist, 'Distribution of Quantities for Outbound Movements', color='lightcoral')
+            show('outbound_quantity_distribution_histogram')
+            return
+
+        # Drop rows without a quantity ('Qty's cases' is numeric from the schema)
         outbound_movements = outbound_movements.dropna(subset=['Qty\'s cases'])
 
         # Plotting the distribution of quantities for outbound movements
@@ -111,17 +145,12 @@ else:
             plt.xlabel('Quantity of Cases')
             plt.ylabel('Frequency')
             plt.tight_layout()
-            plt.show()
+            show('outbound_quantity_distribution_histogram')
         else:
             print("Column 'Qty's cases' not found or contains no data in outbound movements.")
 
     # Function to plot inbound movements
-    def plot_inbound(inbound_movements):
-        # Grouping inbound movements by 'Sending Date'
-        inbound_counts = inbound_movements.groupby(inbound_movements['Sending Date'].dt.to_period('M')).size()
-        inbound_counts = inbound_counts.reset_index(name='Count')
-        inbound_counts['Sending Date'] = inbound_counts['Sending Date'].dt.to_timestamp()
-
+    def plot_inbound(inbound_counts, inbound_movements=None):
         # Plot historical data
         plt.figure(figsize=(8, 4))
         plt.plot(inbound_counts['Sending Date'], inbound_counts['Count'], marker='o', color='green', label='Historical Data')
@@ -155,10 +184,19 @@ else:
         plt.xlim(pd.Timestamp('2024-01-01'), future_predictions['Sending Date'].max())
         plt.tight_layout()
         plt.legend()
-        plt.show()
-
-        # Convert 'Qty's cases' to numeric and drop NaN values
-        inbound_movements['Qty\'s cases'] = pd.to_numeric(inbound_movements['Qty\'s cases'], errors='coerce')
+        show('inbound_movements_forecast')
+
+        # Streaming mode keeps no raw rows: the histogram comes from the quantity sketch
+        if inbound_movements is None:
+            hist = sketch_histogram(select(quantities, **{'Type Of Movement': 'Inbound', 'Dimension': 'Total'}))
+            if hist is None:
+                print("Column 'Qty's cases' contains no data in inbound movements.")
+                return
+            plot_quantity_histogram(hist, 'Distribution of Quantities for Inbound Movements', color='lightblue')
+            show('inbound_quantity_distribution_histogram')
+            return
+
+        # Drop rows without a quantity ('Qty's cases' is numeric from the schema)
         inbound_movements = inbound_movements.dropna(subset=['Qty\'s cases'])
 
         # Plotting the distribution of quantities for inbound movements
@@ -169,10 +207,10 @@ else:
             plt.xlabel('Quantity of Cases')
             plt.ylabel('Frequency')
             plt.tight_layout()
-            plt.show()
+            show('inbound_quantity_distribution_histogram')
         else:
             print("Column 'Qty's cases' not found or contains no data in inbound movements.")
 
     # Call plotting functions for outbound and inbound movements
-    plot_outbound(outbound_movements)
-    plot_inbound(inbound_movements)
\ No newline at end of file
+    plot_outbound(outbound_counts, outbound_movements)
+    plot_inbound(inbound_counts, inbound_movements)
\ No newline at end of file
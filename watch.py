@@ -0,0 +1,267 @@
+import os
+
+# Render off-screen; must be set before anything imports pyplot
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import io  # noqa: E402
+import time  # noqa: E402
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from charts import plot_item_forecast, plot_movements_forecast  # noqa: E402
+from cube import build_cube, cube_metrics, load_cube, merge_cubes, negate_cube, store_cube  # noqa: E402
+from deck import DECK_METRICS, deck_charts  # noqa: E402
+from forecast import FORECAST_MONTHS, MOVING_AVERAGE_MONTHS, forecast_items  # noqa: E402
+from incremental import complete_size  # noqa: E402
+from loader import INVOICE_CSV, TRACKER_CSV, finish_frame, raw_usecols  # noqa: E402
+from render import refresh_chart, safe_name, write_manifests  # noqa: E402
+from schema import INVOICE_SCHEMA, TRACKER_SCHEMA, read_dtypes  # noqa: E402
+
+# Seconds between checks of the watched files
+POLL_SECONDS = 2.0
+
+# Months the reports cover (all.py and Pre.py stop at August 2024)
+REPORT_MONTHS = slice(None, '2024-08')
+
+
+# The complete rows of a file as raw lines, with a 64-bit hash per line.
+# Blank lines are dropped, as read_csv skips them too. A row still being written
+# at the end of the file is left for the next check.
+def snapshot(path):
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        data = f.read(complete_size(path))
+    lines = data.split(b'\n')[:-1]
+    rows = np.array([line for line in lines[1:] if line.rstrip(b'\r')], dtype=object)
+    return {
+        'signature': (stat.st_size, stat.st_mtime_ns),
+        'header': lines[0] if lines else b'',
+        'rows': rows,
+        'hashes': pd.util.hash_array(rows, categorize=False) if len(rows) else np.zeros(0, dtype='uint64'),
+    }
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+# Number of each value among the earlier equal values
+def _occurrence(values):
+    order = np.argsort(values, kind='stable')
+    ordered = values[order]
+    starts = np.ones(len(values), dtype=bool)
+    starts[1:] = ordered[1:] != ordered[:-1]
+    positions = np.arange(len(values))
+    occurrence = np.empty(len(values), dtype='int64')
+    occurrence[order] = positions - np.maximum.accumulate(np.where(starts, positions, 0))
+    return occurrence
+
+
+# Positions of the rows of `values` beyond the number of equal rows in `other`
+def _surplus(values, other):
+    uniques, counts = np.unique(other, return_counts=True)
+    position = np.searchsorted(uniques, values)
+    found = position < len(uniques)
+    found[found] = uniques[position[found]] == values[found]
+    available = np.zeros(len(values), dtype='int64')
+    available[found] = counts[position[found]]
+    return np.flatnonzero(_occurrence(values) >= available)
+
+
+# Length of the common prefix of two hash arrays
+def _common_prefix(a, b):
+    n = min(len(a), len(b))
+    mismatch = np.flatnonzero(a[:n] != b[:n])
+    return int(mismatch[0]) if len(mismatch) else n
+
+
+# Rows removed from the old snapshot and rows added in the new one, compared as
+# multisets of lines: an edited row shows up as one removal plus one addition,
+# and rows that only moved are not changes at all. The unchanged head and tail
+# of the file are skipped first, so appends and local edits cost one comparison.
+def diff_rows(old, new):
+    old_hashes, new_hashes = old['hashes'], new['hashes']
+    head = _common_prefix(old_hashes, new_hashes)
+    old_hashes, new_hashes = old_hashes[head:], new_hashes[head:]
+    tail = _common_prefix(old_hashes[::-1], new_hashes[::-1])
+    old_hashes, new_hashes = old_hashes[:len(old_hashes) - tail], new_hashes[:len(new_hashes) - tail]
+    return head + _surplus(old_hashes, new_hashes), head + _surplus(new_hashes, old_hashes)
+
+
+# Parse raw CSV lines (without the header) into a typed frame, materializing only
+# `columns` (schema names) when given. `date_formats` holds the formats detected
+# on the whole file: a handful of changed rows alone can't tell '05/03/2024' is day-first.
+def parse_rows(header, rows, schema, date_formats=None, columns=None):
+    names = pd.read_csv(io.BytesIO(header), nrows=0).columns
+    text = b'\n'.join([header, *rows]) + b'\n'
+    df = pd.read_csv(io.BytesIO(text), usecols=raw_usecols(names, schema, columns), dtype=read_dtypes(names, schema))
+    return finish_frame(df, schema, date_formats)
+
+
+# Date formats of a whole snapshot, detected from its date columns only
+def detect_date_formats(snap, schema):
+    date_formats = {}
+    dates = [column for column, kind in schema.items() if kind == 'date']
+    parse_rows(snap['header'], snap['rows'], schema, date_formats, columns=dates)
+    return date_formats
+
+
+# Months ('YYYY-MM') of a set of tracker rows
+def _months(df):
+    return set(df['Sending Date'].dropna().dt.strftime('%Y-%m'))
+
+
+def _movement_predictions(counts):
+    average = counts['Count'].tail(MOVING_AVERAGE_MONTHS).mean()
+    dates = pd.date_range(counts['Sending Date'].max() + pd.offsets.MonthEnd(1), periods=FORECAST_MONTHS,
+                          freq=pd.offsets.MonthEnd())
+    return pd.DataFrame({'Sending Date': dates, 'Predicted Count': average})
+
+
+# Render the jobs, skipping every chart whose inputs are unchanged (render.render_chart's cache),
+# and save the chart manifest. Returns the file names that were actually redrawn.
+def _render(jobs):
+    redrawn = [filename for filename, func, args in jobs if refresh_chart(filename, func, *args)]
+    write_manifests()
+    return redrawn
+
+
+# Tracker side: the cube kept up to date by row deltas, and its charts
+class TrackerWatch:
+    def __init__(self, path=TRACKER_CSV):
+        self.path = path
+        self.snapshot = snapshot(path)
+        self.date_formats = detect_date_formats(self.snapshot, TRACKER_SCHEMA)
+        self.cube = load_cube(path)
+
+    # Apply the rows changed since the last snapshot to the cube
+    def update(self):
+        new = snapshot(self.path)
+        rebuild = new['header'] != self.snapshot['header']
+        if not rebuild:
+            # Removed rows are read with the same formats they were counted with
+            removed_lines, added_lines = diff_rows(self.snapshot, new)
+            removed = parse_rows(new['header'], self.snapshot['rows'][removed_lines], TRACKER_SCHEMA,
+                                 self.date_formats)
+            added = parse_rows(new['header'], new['rows'][added_lines], TRACKER_SCHEMA, self.date_formats)
+            # Lines of a quoted multi-line field don't parse to one row each
+            rebuild = len(removed) != len(removed_lines) or len(added) != len(added_lines)
+        if rebuild:
+            # Different columns or changed lines that aren't whole rows: every row counts as new
+            self.date_formats = {}
+            removed = parse_rows(new['header'], [], TRACKER_SCHEMA, self.date_formats)
+            added = parse_rows(new['header'], new['rows'], TRACKER_SCHEMA, self.date_formats)
+            self.cube = build_cube(added)
+        else:
+            self.cube = merge_cubes([self.cube, build_cube(added), negate_cube(build_cube(removed))])
+        self.snapshot = new
+        store_cube(self.cube, self.path)
+        return {'removed': len(removed), 'added': len(added), 'changed': sorted(_months(removed) | _months(added))}
+
+    # The deck charts and the monthly movement forecast, from the cube
+    def charts(self):
+        metrics = cube_metrics(self.cube, DECK_METRICS, months=REPORT_MONTHS)
+        jobs = list(deck_charts(metrics).values())
+        outbound, inbound = metrics['monthly_outbound'], metrics['monthly_inbound']
+        if len(outbound) and len(inbound):
+            jobs.append(('movements_forecast.png', plot_movements_forecast,
+                         (outbound, inbound, _movement_predictions(outbound), _movement_predictions(inbound))))
+        return jobs
+
+
+# Invoice side: the typed rows, per-item forecasts recomputed only for the items that changed
+class InvoiceWatch:
+    def __init__(self, path=INVOICE_CSV):
+        self.path = path
+        self.snapshot = snapshot(path)
+        self.date_formats = {}
+        self.df = parse_rows(self.snapshot['header'], self.snapshot['rows'], INVOICE_SCHEMA, self.date_formats)
+        self.forecasts = self._forecast(self.df)
+        self.changed_items = set(self.forecasts['Item Name'].unique())
+
+    @staticmethod
+    def _forecast(df):
+        return forecast_items(df.dropna(subset=['Quantity']))
+
+    def _reload(self):
+        self.__init__(self.path)
+        return {'removed': 0, 'added': len(self.df), 'changed': sorted(self.changed_items)}
+
+    def update(self):
+        new = snapshot(self.path)
+        # Frame positions only match snapshot lines while every line is one row
+        # (a quoted field can span lines), so anything else is reloaded in full
+        if new['header'] != self.snapshot['header'] or len(self.df) != len(self.snapshot['rows']):
+            return self._reload()
+        removed, added = diff_rows(self.snapshot, new)
+        if not len(removed) and not len(added):
+            # Only blank lines or the file's timestamp changed
+            self.snapshot, self.changed_items = new, set()
+            return {'removed': 0, 'added': 0, 'changed': []}
+        added_rows = parse_rows(new['header'], new['rows'][added], INVOICE_SCHEMA, self.date_formats)
+        if len(added_rows) != len(added):
+            return self._reload()
+        # Rows are kept in file order, so removed lines are the same positions of the frame
+        items = set(self.df['Item Name'].iloc[removed].dropna()) | set(added_rows['Item Name'].dropna())
+        self.df = pd.concat([self.df.drop(self.df.index[removed]), added_rows], ignore_index=True)
+        self.snapshot = {**new, **{name: np.concatenate([np.delete(self.snapshot[name], removed), new[name][added]])
+                                   for name in ['rows', 'hashes']}}
+
+        # An item's forecast depends only on its own rows
+        changed = self.df[self.df['Item Name'].isin(items)]
+        kept = self.forecasts[~self.forecasts['Item Name'].isin(items)]
+        self.forecasts = pd.concat([kept, self._forecast(changed)], ignore_index=True)
+        self.changed_items = items
+        return {'removed': len(removed), 'added': len(added), 'changed': sorted(items)}
+
+    # Forecast charts of the items changed by the last update
+    def charts(self):
+        return [(f'forecast_{safe_name(item)}.png', plot_item_forecast, (item, pred_data))
+                for item, pred_data in self.forecasts.groupby('Item Name', observed=True, sort=False)
+                if item in self.changed_items]
+
+
+# Poll the tracker and invoice files; after a file changes (and has stopped
+# changing for one interval) apply only the changed rows and redraw only the
+# charts whose data moved. Runs until interrupted, or once with `once=True`.
+def watch(tracker=TRACKER_CSV, invoices=INVOICE_CSV, interval=POLL_SECONDS, once=False):
+    watchers = {}
+    for name, path, cls in [('tracker', tracker, TrackerWatch), ('invoices', invoices, InvoiceWatch)]:
+        if path and os.path.exists(path):
+            started = time.perf_counter()
+            watchers[name] = cls(path)
+            redrawn = _render(watchers[name].charts())
+            print(f"{name}: loaded {path} in {time.perf_counter() - started:.2f}s, {len(redrawn)} charts redrawn")
+    pending = {}
+    try:
+        while True:
+            for name, watcher in watchers.items():
+                signature = _signature(watcher.path)
+                if signature == watcher.snapshot['signature']:
+                    pending.pop(name, None)
+                    continue
+                # Wait until the file stops changing before reading it
+                if pending.get(name) != signature and not once:
+                    pending[name] = signature
+                    continue
+                pending.pop(name, None)
+                started = time.perf_counter()
+                change = watcher.update()
+                redrawn = _render(watcher.charts())
+                print(f"{name}: -{change['removed']} +{change['added']} rows, "
+                      f"{len(redrawn)} charts redrawn in {time.perf_counter() - started:.2f}s "
+                      f"({', '.join(map(str, change['changed']))})")
+            if once:
+                return watchers
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        return watchers
+
+
+if __name__ == '__main__':
+    import sys
+
+    # watch.py [interval seconds]
+    watch(interval=float(sys.argv[1]) if len(sys.argv) > 1 else POLL_SECONDS)